@@ -1,4 +1,4 @@
-import sqlite3
+from connection_pool import get_pool
 
 class DatabaseConnection:
     def __init__(self, db_name='users.db'):
@@ -7,18 +7,20 @@ class DatabaseConnection:
         self.cursor = None
     
     def __enter__(self):
-        # Open the database connection
-        self.conn = sqlite3.connect(self.db_name)
+        # Borrow a connection from the shared pool for this database
+        self.conn = get_pool(self.db_name).acquire()
         self.cursor = self.conn.cursor()
         print(f"Connected to database: {self.db_name}")
         return self.cursor
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # Close the connection
+        # Close the cursor and hand the connection back to the pool
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
+            get_pool(self.db_name).release(self.conn)
+            self.conn = None
         print("Database connection closed")
         
         # Return False to propagate exceptions, True to suppress them
@@ -1,41 +1,136 @@
 import sqlite3
+import threading
+from collections import OrderedDict
+from connection_pool import get_pool
+
+# Number of prepared statements each pooled connection keeps
+STATEMENT_CACHE_SIZE = 256
+
+
+class StatementCachingConnection(sqlite3.Connection):
+    """sqlite3 connection that estimates its prepared statement cache use
+
+    sqlite3 keeps a per-connection LRU of prepared statements keyed by the
+    query text, sized by `cached_statements`; a query found there is run
+    without being parsed again. sqlite3 does not expose that cache, so this
+    keeps a Python-side LRU of the queries run through ExecuteQuery with
+    the same size. Its hits and misses are an estimate: statements run
+    directly on the connection are not counted, so they may have pushed a
+    query out of sqlite3's cache without this noticing.
+    """
+
+    def __init__(self, *args, cached_statements=STATEMENT_CACHE_SIZE, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements, **kwargs)
+        self.statement_capacity = cached_statements
+        self.statements = OrderedDict()
+
+    def track_statement(self, query):
+        """Record a successful run of `query`
+
+        Returns (hit, evicted): whether it was probably still prepared, and
+        whether preparing it probably pushed another query out.
+        """
+        if query in self.statements:
+            self.statements.move_to_end(query)
+            return True, False
+        self.statements[query] = None
+        if len(self.statements) > self.statement_capacity:
+            self.statements.popitem(last=False)
+            return False, True
+        return False, False
+
 
 class ExecuteQuery:
-    def __init__(self, query, params=None, db_name='users.db'):
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __init__(self, query, params=None, db_name='users.db', stream=False,
+                 block_size=500):
         self.query = query
         self.params = params
         self.db_name = db_name
+        # In streaming mode __enter__ returns an iterator of fetchmany blocks
+        # instead of the full result; the cursor stays open until __exit__
+        self.stream = stream
+        self.block_size = block_size
+        self.pool = None
         self.conn = None
         self.cursor = None
         self.results = None
-    
+
+    @classmethod
+    def _record(cls, hit, evicted):
+        with cls._lock:
+            cls._stats["hits" if hit else "misses"] += 1
+            cls._stats["evictions"] += evicted
+
+    @classmethod
+    def cache_stats(cls):
+        """Return estimated prepared statement cache hit/miss/eviction counters
+
+        See StatementCachingConnection: these count successful ExecuteQuery
+        calls against a mirror of sqlite3's cache, not sqlite3's own
+        counters, which it does not expose.
+        """
+        with cls._lock:
+            stats = dict(cls._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
     def __enter__(self):
-        # Open the database connection and execute the query
-        self.conn = sqlite3.connect(self.db_name)
+        # Borrow a pooled connection and execute the query. The factory
+        # only applies if this creates the pool; if DatabaseConnection made
+        # it first, get_pool warns and its connections go uncounted
+        self.pool = get_pool(self.db_name, factory=StatementCachingConnection)
+        self.conn = self.pool.acquire()
         self.cursor = self.conn.cursor()
-        
+
         # Execute the query with parameters if provided
-        if self.params:
-            self.cursor.execute(self.query, self.params)
-        else:
-            self.cursor.execute(self.query)
-        
+        try:
+            if self.params:
+                self.cursor.execute(self.query, self.params)
+            else:
+                self.cursor.execute(self.query)
+        except BaseException:
+            # __exit__ is not called when __enter__ fails; release here
+            self.__exit__(None, None, None)
+            raise
+
+        # A statement that failed to prepare was never cached
+        if isinstance(self.conn, StatementCachingConnection):
+            self._record(*self.conn.track_statement(self.query))
+
+        if self.stream:
+            return self._blocks()
+
         # Fetch all results
         self.results = self.cursor.fetchall()
         return self.results
-    
+
+    def _blocks(self):
+        """Yield the result in lists of up to block_size rows"""
+        while True:
+            rows = self.cursor.fetchmany(self.block_size)
+            if not rows:
+                break
+            yield rows
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        # Close the cursor and connection
+        # Close the cursor and hand the connection back to the pool
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-        
+            self.pool.release(self.conn)
+            self.conn = None
+
         # Return False to propagate exceptions
         return False
 
 # Using the context manager to execute the query with parameter
-with ExecuteQuery("SELECT * FROM users WHERE age > ?", (25,)) as results:
-    print("Users over 25 years old:")
-    for row in results:
-        print(row)
\ No newline at end of file
+if __name__ == "__main__":
+    with ExecuteQuery("SELECT * FROM users WHERE age > ?", (25,)) as results:
+        print("Users over 25 years old:")
+        for row in results:
+            print(row)
@@ -1,6 +1,8 @@
 import asyncio
 import aiosqlite
+from singleflight import coalesce, flights
 
+@coalesce
 async def async_fetch_users():
     """Fetch all users from the database"""
     async with aiosqlite.connect('users.db') as db:
@@ -11,6 +13,7 @@ async def async_fetch_users():
                 print(row)
             return results
 
+@coalesce
 async def async_fetch_older_users():
     """Fetch users older than 40 from the database"""
     async with aiosqlite.connect('users.db') as db:
@@ -34,4 +37,5 @@ if __name__ == "__main__":
     all_users, older_users = asyncio.run(fetch_concurrently())
     print("\nConcurrent fetch completed!")
     print(f"Total users: {len(all_users)}")
-    print(f"Users over 40: {len(older_users)}")
\ No newline at end of file
+    print(f"Users over 40: {len(older_users)}")
+    print(f"Coalescing: {flights.stats()}")
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Microbenchmark: per-call latency of ExecuteQuery on a hot query.
+
+Compares a fresh connection per call (the old behaviour), a pooled
+connection with the statement cache disabled (parse on every call), and
+the pooled, statement-caching ExecuteQuery.
+
+Usage: python bench_execute_query.py [calls]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+ExecuteQuery = __import__('1-execute').ExecuteQuery
+from connection_pool import ConnectionPool
+
+QUERY = "SELECT * FROM users WHERE age > ?"
+
+
+def per_call_us(label, run, calls):
+    """Run `run` `calls` times and print the mean latency in microseconds"""
+    start = time.perf_counter()
+    for i in range(calls):
+        run(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / calls * 1e6:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, "users.db")
+        conn = sqlite3.connect(db_name)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                     "email TEXT, age INTEGER)")
+        conn.executemany("INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+                         ((f"user{i}", f"user{i}@example.com", 20 + i % 60)
+                          for i in range(50)))
+        conn.commit()
+        conn.close()
+
+        def fresh_connection(i):
+            conn = sqlite3.connect(db_name)
+            conn.execute(QUERY, (70 + i % 10,)).fetchall()
+            conn.close()
+
+        uncached = ConnectionPool(db_name, cached_statements=0)
+
+        def pooled_no_cache(i):
+            with uncached.connection() as conn:
+                conn.execute(QUERY, (70 + i % 10,)).fetchall()
+
+        def execute_query(i):
+            with ExecuteQuery(QUERY, (70 + i % 10,), db_name=db_name):
+                pass
+
+        per_call_us("new connection per call", fresh_connection, calls)
+        per_call_us("pooled, statement cache off", pooled_no_cache, calls)
+        per_call_us("ExecuteQuery (pooled, cached)", execute_query, calls)
+        print(ExecuteQuery.cache_stats())
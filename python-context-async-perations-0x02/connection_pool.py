@@ -0,0 +1,537 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import warnings
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+import db_events
+
+try:
+    import aiosqlite
+except ImportError:  # only needed by AsyncConnectionPool
+    aiosqlite = None
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the timeout"""
+
+
+def _check_shareable(database):
+    # Every connection to ":memory:" (or "") opens its own private, empty
+    # database, so a pool of them would hand out unrelated databases
+    if database in ("", ":memory:"):
+        raise ValueError(
+            f"Cannot pool {database!r}: each connection would get its own "
+            "empty database. Use a file, or a shared in-memory database "
+            "such as 'file:name?mode=memory&cache=shared' with uri=True")
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "owner", "last_used", "last_checked")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.owner = None
+        self.last_used = now
+        self.last_checked = now
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable sqlite3 connections to one database.
+
+    Connections stay open between uses so SQLite's page cache and each
+    connection's statement cache survive. A thread gets back the connection
+    it used last when that one is idle (per-thread affinity); otherwise the
+    most recently used idle connection is handed out, so surplus ones age
+    out after `idle_timeout` seconds (never dropping below `min_size`).
+    Connections idle for longer than `health_check_interval` are checked
+    with a trivial query before being handed out.
+
+    ":memory:" cannot be pooled, since each connection to it is a separate
+    empty database; use a file or a shared-cache in-memory URI instead.
+    """
+
+    def __init__(self, database, min_size=1, max_size=10, idle_timeout=300.0,
+                 health_check_interval=30.0, acquire_timeout=30.0,
+                 **connect_kwargs):
+        _check_shareable(database)
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(
+                "Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        # Pooled connections are handed between threads
+        self.connect_kwargs = dict(connect_kwargs, check_same_thread=False)
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self._metrics = {
+            "acquisitions": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "affinity_hits": 0,
+            "created": 0,
+            "discarded_unhealthy": 0,
+            "discarded_idle": 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append(_PooledConnection(self._connect()))
+            self._size += 1
+            self._metrics["created"] += 1
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, **self.connect_kwargs)
+        # Report statements to db_events (write tracking, metrics)
+        db_events.trace(conn)
+        return conn
+
+    def _healthy(self, entry, now):
+        if now - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            with db_events.untracked():
+                entry.conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        entry.last_checked = now
+        return True
+
+    def _discard(self, entry):
+        self._size -= 1
+        try:
+            entry.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _reap_idle(self, now):
+        """Closes connections idle for too long, keeping min_size open"""
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0].last_used > self.idle_timeout):
+            self._discard(self._idle.popleft())
+            self._metrics["discarded_idle"] += 1
+
+    def _take_idle(self, thread_id):
+        for entry in reversed(self._idle):
+            if entry.owner == thread_id:
+                self._idle.remove(entry)
+                self._metrics["affinity_hits"] += 1
+                return entry
+        return self._idle.pop() if self._idle else None
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to `timeout` seconds for one"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        thread_id = threading.get_ident()
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                now = time.monotonic()
+                self._reap_idle(now)
+
+                entry = self._take_idle(thread_id)
+                if entry is not None:
+                    if self._healthy(entry, now):
+                        break
+                    self._discard(entry)
+                    self._metrics["discarded_unhealthy"] += 1
+                    continue
+
+                if self._size < self.max_size:
+                    # Reserve the slot, then connect without holding the lock
+                    self._size += 1
+                    self._cond.release()
+                    try:
+                        entry = _PooledConnection(self._connect())
+                    except BaseException:
+                        self._cond.acquire()
+                        self._size -= 1
+                        self._cond.notify()
+                        raise
+                    self._cond.acquire()
+                    self._metrics["created"] += 1
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No connection to {self.database} available "
+                        f"after {timeout:.1f}s (max_size={self.max_size})")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_time = time.monotonic() - start
+            metrics = self._metrics
+            metrics["acquisitions"] += 1
+            metrics["wait_time_total"] += wait_time
+            metrics["wait_time_max"] = max(metrics["wait_time_max"], wait_time)
+            if waited:
+                metrics["waits"] += 1
+            entry.owner = thread_id
+            self._in_use[id(entry.conn)] = entry
+            return entry.conn
+
+    def release(self, conn):
+        """Return a borrowed connection to the pool"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+            if entry is None:
+                raise ValueError("Connection was not borrowed from this pool")
+            try:
+                # Never hand out a connection with a half-done transaction
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._discard(entry)
+                self._metrics["discarded_unhealthy"] += 1
+            else:
+                if self._closed:
+                    self._discard(entry)
+                else:
+                    entry.last_used = time.monotonic()
+                    self._idle.append(entry)
+            self._reap_idle(time.monotonic())
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection and gives it back"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close idle connections; borrowed ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+    def stats(self):
+        """Snapshot of pool size and acquisition-wait metrics"""
+        with self._cond:
+            snapshot = dict(self._metrics)
+            snapshot.update(
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        acquisitions = snapshot["acquisitions"]
+        snapshot["wait_time_avg"] = (snapshot["wait_time_total"] / acquisitions
+                                     if acquisitions else 0.0)
+        return snapshot
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_UNSET = object()
+
+
+def _warn_ignored_options(pool, pool_kwargs):
+    """Warn about options that differ from those an existing pool has"""
+    ignored = sorted(
+        name for name, value in pool_kwargs.items()
+        if getattr(pool, name, pool.connect_kwargs.get(name, _UNSET)) != value)
+    if ignored:
+        warnings.warn(
+            f"The pool for {pool.database} already exists; ignoring "
+            f"{', '.join(ignored)} (options only apply when it is created)",
+            RuntimeWarning, stacklevel=3)
+
+
+def get_pool(database='users.db', **pool_kwargs):
+    """Return the process-wide pool for `database`, creating it on first use
+
+    Keyword arguments only take effect when the pool is created; asking
+    an existing pool for different ones warns. ":memory:" is rejected: see
+    ConnectionPool.
+    """
+    key = os.path.abspath(database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(database, **pool_kwargs)
+        elif pool_kwargs:
+            _warn_ignored_options(pool, pool_kwargs)
+        return pool
+
+
+class AsyncConnectionPool:
+    """asyncio counterpart of ConnectionPool over aiosqlite connections
+
+    Same sizing, idle timeout, health checks and wait metrics; there is no
+    per-thread affinity since all borrowers run on one event loop. Waiting
+    for a connection suspends the coroutine instead of blocking the loop.
+    """
+
+    def __init__(self, database, min_size=0, max_size=10, idle_timeout=300.0,
+                 health_check_interval=30.0, acquire_timeout=30.0,
+                 **connect_kwargs):
+        if aiosqlite is None:
+            raise ImportError("AsyncConnectionPool requires aiosqlite")
+        _check_shareable(database)
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(
+                "Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = asyncio.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self._metrics = {
+            "acquisitions": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded_unhealthy": 0,
+            "discarded_idle": 0,
+        }
+
+    async def _healthy(self, entry, now):
+        if now - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            async with entry.conn.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+        except (sqlite3.Error, ValueError):
+            return False
+        entry.last_checked = now
+        return True
+
+    @staticmethod
+    async def _close_all(entries):
+        for entry in entries:
+            try:
+                await entry.conn.close()
+            except (sqlite3.Error, ValueError):
+                pass
+
+    def _take_idle_expired(self, now):
+        # Caller holds the condition; returns the entries it must close
+        expired = []
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0].last_used > self.idle_timeout):
+            expired.append(self._idle.popleft())
+            self._size -= 1
+            self._metrics["discarded_idle"] += 1
+        return expired
+
+    async def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to `timeout` seconds for one
+
+        Connecting and health checks happen outside the pool's lock, so one
+        slow connect does not hold up the other borrowers.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            entry = None
+            doomed = []
+            try:
+                async with self._cond:
+                    while True:
+                        if self._closed:
+                            raise RuntimeError("Connection pool is closed")
+                        now = time.monotonic()
+                        doomed += self._take_idle_expired(now)
+                        if self._idle:
+                            entry = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            # Reserve a slot; connect once the lock is released
+                            self._size += 1
+                            break
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._metrics["timeouts"] += 1
+                            raise PoolTimeout(
+                                f"No connection to {self.database} available "
+                                f"after {timeout:.1f}s (max_size={self.max_size})")
+                        waited = True
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+            finally:
+                await self._close_all(doomed)
+
+            if entry is None:
+                try:
+                    conn = await aiosqlite.connect(self.database,
+                                                   **self.connect_kwargs)
+                except BaseException:
+                    async with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                entry = _PooledConnection(conn)
+                self._metrics["created"] += 1
+                break
+            if await self._healthy(entry, time.monotonic()):
+                break
+            async with self._cond:
+                self._size -= 1
+                self._metrics["discarded_unhealthy"] += 1
+                self._cond.notify()
+            await self._close_all([entry])
+
+        wait_time = time.monotonic() - start
+        metrics = self._metrics
+        metrics["acquisitions"] += 1
+        metrics["wait_time_total"] += wait_time
+        metrics["wait_time_max"] = max(metrics["wait_time_max"], wait_time)
+        if waited:
+            metrics["waits"] += 1
+        self._in_use[id(entry.conn)] = entry
+        return entry.conn
+
+    async def release(self, conn):
+        """Return a borrowed connection to the pool"""
+        entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Connection was not borrowed from this pool")
+        healthy = True
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except (sqlite3.Error, ValueError):
+            healthy = False
+
+        doomed = []
+        async with self._cond:
+            if not healthy or self._closed:
+                self._size -= 1
+                doomed.append(entry)
+                if not healthy:
+                    self._metrics["discarded_unhealthy"] += 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            doomed += self._take_idle_expired(time.monotonic())
+            self._cond.notify()
+        await self._close_all(doomed)
+
+    @asynccontextmanager
+    async def connection(self, timeout=None):
+        """Async context manager that borrows a connection and gives it back"""
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close(self):
+        """Close idle connections; borrowed ones are closed when released"""
+        async with self._cond:
+            self._closed = True
+            doomed = list(self._idle)
+            self._idle.clear()
+            self._size -= len(doomed)
+            self._cond.notify_all()
+        await self._close_all(doomed)
+
+    def stats(self):
+        """Snapshot of pool size and acquisition-wait metrics"""
+        snapshot = dict(self._metrics)
+        snapshot.update(
+            size=self._size,
+            idle=len(self._idle),
+            in_use=len(self._in_use),
+            min_size=self.min_size,
+            max_size=self.max_size,
+        )
+        acquisitions = snapshot["acquisitions"]
+        snapshot["wait_time_avg"] = (snapshot["wait_time_total"] / acquisitions
+                                     if acquisitions else 0.0)
+        return snapshot
+
+
+# Event loop -> {database: AsyncConnectionPool}; asyncio primitives belong
+# to one loop, so every loop gets its own pools
+_async_pools = weakref.WeakKeyDictionary()
+
+
+async def _close_at_shutdown(loop, pools):
+    """Wait until the loop shuts down, then close its pools
+
+    asyncio.run() cancels leftover tasks before closing the loop; without
+    this, idle aiosqlite connections (each with a non-daemon worker thread)
+    would outlive the loop and keep the interpreter from exiting.
+    """
+    try:
+        await loop.create_future()
+    finally:
+        _async_pools.pop(loop, None)
+        for pool in list(pools.values()):
+            await pool.close()
+
+
+async def close_async_pools():
+    """Close the running loop's pools (for loops not run by asyncio.run)"""
+    loop = asyncio.get_running_loop()
+    pools, closer = _async_pools.pop(loop, ({}, None))
+    if closer is not None:
+        closer.cancel()
+    for pool in list(pools.values()):
+        await pool.close()
+
+
+def get_async_pool(database='users.db', **pool_kwargs):
+    """Return the running event loop's pool for `database`
+
+    Keyword arguments only take effect when the pool is created; asking
+    an existing pool for different ones warns. The loop's pools are closed when asyncio.run() finishes; other loops
+    should await close_async_pools() before closing.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_pools.get(loop)
+    if entry is None:
+        pools = {}
+        # Holding the task here keeps it from being garbage collected
+        entry = _async_pools[loop] = (
+            pools, loop.create_task(_close_at_shutdown(loop, pools)))
+    pools = entry[0]
+    key = os.path.abspath(database)
+    pool = pools.get(key)
+    if pool is None:
+        pool = pools[key] = AsyncConnectionPool(database, **pool_kwargs)
+    elif pool_kwargs:
+        _warn_ignored_options(pool, pool_kwargs)
+    return pool
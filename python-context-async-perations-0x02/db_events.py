@@ -0,0 +1,200 @@
+import logging
+import re
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+# Tables written by statements run inside the current track_writes() block
+_written = ContextVar("written_tables", default=None)
+# SQL of the statements run inside the current collect_statements() block
+_statements = ContextVar("statements", default=None)
+
+_commit_listeners = []
+_listeners_lock = threading.Lock()
+
+logger = logging.getLogger("queries.events")
+
+# Wildcard table name: matches every table
+ALL_TABLES = "*"
+
+_IDENT = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|[\w$]+)'
+_NAME = rf'{_IDENT}(?:\s*\.\s*{_IDENT})?'
+_WRITE = re.compile(
+    rf'\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|'
+    rf'UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM|'
+    rf'(?:DROP|ALTER|CREATE)\s+TABLE(?:\s+IF(?:\s+NOT)?\s+EXISTS)?)\s+({_NAME})',
+    re.IGNORECASE)
+_READ = re.compile(
+    rf'\b(?:FROM|JOIN)\s+({_NAME}(?:\s+(?:AS\s+)?{_IDENT})?'
+    rf'(?:\s*,\s*{_NAME}(?:\s+(?:AS\s+)?{_IDENT})?)*)',
+    re.IGNORECASE)
+_KEYWORDS = {"where", "group", "order", "limit", "join", "inner", "left",
+             "right", "cross", "natural", "on", "using", "union", "having",
+             "window", "offset", "outer", "full", "except", "intersect"}
+
+
+def _table_name(name):
+    """Strip quoting and the schema prefix; table names compare lowercase"""
+    name = name.split(".")[-1].strip()
+    return name.strip('"`[]').lower()
+
+
+def _is_temp(name):
+    """True for a name qualified with the connection-private temp schema"""
+    schema, dot, _ = name.partition(".")
+    return bool(dot) and schema.strip().strip('"`[]').lower() == "temp"
+
+
+@lru_cache(maxsize=4096)
+def tables_written(sql):
+    """Names of the tables an INSERT/UPDATE/DELETE/DDL statement modifies
+
+    Writes to temp.* tables are left out: no other connection can read
+    them, so they never make a cached result stale.
+    """
+    return frozenset(_table_name(m.group(1)) for m in _WRITE.finditer(sql)
+                     if not _is_temp(m.group(1)))
+
+
+@lru_cache(maxsize=4096)
+def tables_read(sql):
+    """Names of the tables a query reads (FROM and JOIN clauses)
+
+    Returns {ALL_TABLES} when the query reads from something this simple
+    parser does not recognise, so it is invalidated by any write.
+    """
+    tables = set()
+    for match in _READ.finditer(sql):
+        for item in match.group(1).split(","):
+            name = item.split()[0]
+            if _table_name(name) not in _KEYWORDS:
+                tables.add(_table_name(name))
+    if not tables and re.search(r'\bFROM\b', sql, re.IGNORECASE):
+        return frozenset((ALL_TABLES,))
+    return frozenset(tables)
+
+
+def _trace(sql):
+    written = _written.get()
+    if written is not None:
+        written.update(tables_written(sql))
+    statements = _statements.get()
+    if statements is not None:
+        statements.append(sql)
+
+
+def trace(conn):
+    """Route the statements a connection executes through db_events"""
+    conn.set_trace_callback(_trace)
+
+
+@contextmanager
+def track_writes(conn):
+    """Collect the names of tables written on `conn` inside the block
+
+    Yields the set, which fills in as statements execute.
+    """
+    trace(conn)
+    written = set()
+    token = _written.set(written)
+    try:
+        yield written
+    finally:
+        _written.reset(token)
+
+
+@contextmanager
+def collect_statements(into=None):
+    """Collect the SQL of statements run on traced connections in the block
+
+    Yields a list that fills in as statements execute (with their
+    parameters expanded into the text), or `into`, any object with append
+    and extend, to handle each statement as it runs instead of keeping it.
+    Connections from ConnectionPool are always traced. Blocks may nest; an
+    enclosing block also receives the statements of the blocks inside it.
+    """
+    statements = [] if into is None else into
+    token = _statements.set(statements)
+    try:
+        yield statements
+    finally:
+        _statements.reset(token)
+        outer = _statements.get()
+        if outer is not None:
+            outer.extend(statements)
+
+
+@contextmanager
+def untracked():
+    """Keep the statements run inside the block out of track_writes and
+    collect_statements (for housekeeping such as pool health checks)"""
+    written = _written.set(None)
+    statements = _statements.set(None)
+    try:
+        yield
+    finally:
+        _statements.reset(statements)
+        _written.reset(written)
+
+
+@asynccontextmanager
+async def async_track_writes(conn):
+    """track_writes for an aiosqlite connection
+
+    aiosqlite runs statements on its own worker thread, outside the task's
+    context, so the trace callback fills this block's set directly.
+    """
+    written = set()
+    await conn.set_trace_callback(
+        lambda sql: written.update(tables_written(sql)))
+    try:
+        yield written
+    finally:
+        await conn.set_trace_callback(None)
+
+
+def on_commit(listener):
+    """Register listener(tables) to be called after a transaction commits
+
+    Bound methods are held weakly, so registering a cache does not keep it
+    alive. Returns the listener, so this works as a decorator too.
+    """
+    try:
+        ref = weakref.WeakMethod(listener)
+    except TypeError:
+        ref = lambda: listener
+    with _listeners_lock:
+        _commit_listeners.append(ref)
+    return listener
+
+
+def publish_commit(tables):
+    """Tell the commit listeners which tables a committed transaction wrote
+
+    Never raises: the transaction has already committed, so a failing
+    listener is logged and the others still run. Raising here would make
+    callers (or retry_on_failure) treat the write as failed and repeat it.
+    """
+    if not tables:
+        return
+    tables = frozenset(tables)
+    with _listeners_lock:
+        refs = list(_commit_listeners)
+    dead = []
+    for ref in refs:
+        listener = ref()
+        if listener is None:
+            dead.append(ref)
+        else:
+            try:
+                listener(tables)
+            except Exception:
+                logger.exception("Commit listener %r failed for tables %s",
+                                 listener, sorted(tables))
+    if dead:
+        with _listeners_lock:
+            for ref in dead:
+                if ref in _commit_listeners:
+                    _commit_listeners.remove(ref)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Unit tests for the 1-execute module."""
+
+import importlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from connection_pool import get_pool
+
+execute = importlib.import_module("1-execute")
+ExecuteQuery = execute.ExecuteQuery
+
+
+class TestExecuteQuery(unittest.TestCase):
+    """Test class for ExecuteQuery and its statement cache estimates."""
+
+    def setUp(self):
+        """Give each test its own users database and fresh counters."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.database = os.path.join(directory, "users.db")
+        conn = sqlite3.connect(self.database)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                     "name TEXT, age INTEGER)")
+        conn.executemany("INSERT INTO users (name, age) VALUES (?, ?)",
+                         [("a", 20), ("b", 30), ("c", 40)])
+        conn.commit()
+        conn.close()
+        ExecuteQuery._stats.update(hits=0, misses=0, evictions=0)
+
+    def query(self, sql, params=None):
+        """Run sql through ExecuteQuery and return its rows."""
+        with ExecuteQuery(sql, params, db_name=self.database) as rows:
+            return rows
+
+    def test_repeated_query_counts_as_hit(self):
+        """Test that the second run of a query is an estimated hit."""
+        sql = "SELECT name FROM users WHERE age > ?"
+        self.assertEqual(self.query(sql, (25,)), [("b",), ("c",)])
+        self.assertEqual(self.query(sql, (35,)), [("c",)])
+        stats = ExecuteQuery.cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_failed_query_is_not_counted(self):
+        """Test that a statement that fails to prepare is not a miss."""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.query("SELECT nope FROM users")
+        self.assertEqual(ExecuteQuery.cache_stats()["misses"], 0)
+        # The connection went back to the pool
+        self.assertEqual(get_pool(self.database).stats()["in_use"], 0)
+
+    def test_eviction_is_estimated_from_capacity(self):
+        """Test that going past cached_statements counts evictions."""
+        conn = execute.StatementCachingConnection(self.database,
+                                                  cached_statements=2)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.track_statement("SELECT 1"), (False, False))
+        self.assertEqual(conn.track_statement("SELECT 2"), (False, False))
+        self.assertEqual(conn.track_statement("SELECT 1"), (True, False))
+        self.assertEqual(conn.track_statement("SELECT 3"), (False, True))
+        self.assertEqual(conn.track_statement("SELECT 2"), (False, True))
+
+    def test_pool_with_other_factory_warns(self):
+        """Test that a pool created without the factory is flagged."""
+        get_pool(self.database)
+        with self.assertWarns(RuntimeWarning):
+            rows = self.query("SELECT name FROM users WHERE age = ?", (20,))
+        self.assertEqual(rows, [("a",)])
+        self.assertEqual(ExecuteQuery.cache_stats()["misses"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Checks that the modules shared with python-decorators-0x01 match.
+
+Each project directory runs on its own, so 0x02 keeps copies of the pool,
+commit-event and coalescing modules instead of importing across
+directories. They must stay identical to the originals: a process that
+loads both projects gets only one module of each name, so the pool,
+commit listeners and request coalescing are shared between them.
+"""
+
+import os
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ORIGINALS = os.path.join(HERE, "..", "python-decorators-0x01")
+SHARED_MODULES = ("connection_pool.py", "db_events.py", "singleflight.py")
+
+
+class TestSharedModules(unittest.TestCase):
+    """Test class for the copies of python-decorators-0x01 modules."""
+
+    def test_copies_match_originals(self):
+        """Test that every shared module is byte-identical to its original."""
+        for name in SHARED_MODULES:
+            with self.subTest(module=name):
+                with open(os.path.join(HERE, name), "rb") as copy, \
+                        open(os.path.join(ORIGINALS, name), "rb") as original:
+                    self.assertEqual(
+                        copy.read(), original.read(),
+                        f"{name} differs from python-decorators-0x01/{name}; "
+                        f"copy the original over it")
+
+
+if __name__ == "__main__":
+    unittest.main()
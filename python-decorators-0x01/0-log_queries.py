@@ -1,23 +1,202 @@
 import sqlite3
+import atexit
 import functools
-from datetime import datetime
+import inspect
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Query records go to this logger; raise its level to WARNING to stop
+# them, and do so before decorating to turn log_queries into a no-op
+logger = logging.getLogger("queries")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+QUERY_FORMAT = ("[%(asctime)s] Query: %(query)s params=%(params)r "
+                "%(duration_ms).2fms rows=%(rows)s (%(caller)s)")
+
+# Drained by the listener thread: LogRecords from ordinary logger calls
+# and bare tuples from log_queries, turned into records off the hot path
+_records = queue.SimpleQueue()
+_listener = None
+# True while the listener only has the stdout handler it started with
+_default_output = False
+_listener_lock = threading.Lock()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue records untouched; formatting happens on the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+class QueryFormatter(logging.Formatter):
+    """Formats query records with QUERY_FORMAT and any other record plainly"""
+
+    def __init__(self, fmt=QUERY_FORMAT, datefmt="%Y-%m-%d %H:%M:%S"):
+        super().__init__(fmt, datefmt)
+        self._plain = logging.Formatter("[%(asctime)s] %(message)s", datefmt)
+
+    def format(self, record):
+        if not hasattr(record, "query"):
+            return self._plain.format(record)
+        text = super().format(record)
+        if record.error:
+            text += f" error={record.error}"
+        return text
+
+
+class _QueryListener(QueueListener):
+    """QueueListener that also accepts the tuples queued by log_queries"""
+
+    def dequeue(self, block):
+        item = self.queue.get(block)
+        if type(item) is not tuple:
+            return item
+        created, level, caller, query, params, duration_ms, rows, error = item
+        record = logger.makeRecord(
+            logger.name, level, caller, 0, "query", None, None, extra={
+                "query": query,
+                "params": params,
+                "duration_ms": duration_ms,
+                "rows": rows,
+                "error": error,
+                "caller": caller,
+            })
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        return record
+
+
+def start_query_logging(*handlers):
+    """Send query records to `handlers` from a background thread
+
+    Callers only put records on an unbounded queue, so logging never waits
+    on the handlers' I/O. Without handlers, records are printed to stdout.
+    Called automatically the first time log_queries decorates a function.
+
+    Called again with handlers while logging runs, the handlers are added;
+    they replace the stdout default if that is all that was running.
+    Records queued before the call go to the previous handlers.
+    """
+    global _listener, _default_output
+    with _listener_lock:
+        if _listener is not None:
+            if not handlers:
+                return _listener
+            current = () if _default_output else _listener.handlers
+            # stop() hands the records queued so far to the old handlers
+            _listener.stop()
+            _listener = _QueryListener(
+                _records, *dict.fromkeys(current + handlers),
+                respect_handler_level=True)
+            _listener.start()
+            _default_output = False
+            return _listener
+        _default_output = not handlers
+        if not handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(QueryFormatter())
+            handlers = (handler,)
+        logger.addHandler(_DeferredQueueHandler(_records))
+        _listener = _QueryListener(_records, *handlers,
+                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_query_logging)
+        return _listener
+
+
+def stop_query_logging():
+    """Flush queued records and stop the background thread"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in list(logger.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                logger.removeHandler(handler)
+        _listener = None
+        atexit.unregister(stop_query_logging)
+
+
+def _split_call(args, kwargs):
+    # The first argument is typically the SQL query
+    if args:
+        return args[0], args[1:]
+    return kwargs.get('query'), tuple(v for k, v in kwargs.items() if k != 'query')
+
+
+def _emit(level, caller, args, kwargs, started, result, error):
+    # The level may have been raised since the function was decorated
+    if _listener is None or not logger.isEnabledFor(level):
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    query, params = _split_call(args, kwargs)
+    try:
+        rows = len(result)
+    except TypeError:
+        rows = None
+    # Only a tuple is built here; the listener thread makes the LogRecord
+    _records.put((time.time(), level, caller,
+                  query if query is not None else "(no query parameter found)",
+                  params, duration_ms, rows, error))
+
 
 #### decorator to log SQL queries with timestamps
-def log_queries(func):
+def log_queries(func=None, *, level=logging.INFO, sample_rate=1.0):
+    """Decorator that logs each query with its parameters, duration,
+    row count and caller as a structured record
+
+    Records carry the extra attributes query, params, duration_ms, rows,
+    error and caller, and are handled off the calling thread (see
+    start_query_logging). With sample_rate below 1 only that fraction of
+    calls is timed and logged. If the "queries" logger is not enabled for
+    `level` when the function is decorated, it is returned unwrapped;
+    raising the level afterwards stops the records too.
+    """
+    if func is None:
+        return functools.partial(log_queries, level=level,
+                                 sample_rate=sample_rate)
+    if not logger.isEnabledFor(level) or sample_rate <= 0:
+        return func
+    start_query_logging()
+    caller = f"{func.__module__}.{func.__qualname__}"
+    sampled = sample_rate < 1
+    rand = random.random
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if sampled and rand() >= sample_rate:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                _emit(level, caller, args, kwargs, started, None, repr(e))
+                raise
+            _emit(level, caller, args, kwargs, started, result, None)
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Get current timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # The first argument is typically the SQL query
-        if args:
-            print(f"[{timestamp}] Query: {args[0]}")
-        elif 'query' in kwargs:
-            print(f"[{timestamp}] Query: {kwargs['query']}")
-        else:
-            print(f"[{timestamp}] Query executed (no query parameter found)")
-        
-        return func(*args, **kwargs)
+        if sampled and rand() >= sample_rate:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            _emit(level, caller, args, kwargs, started, None, repr(e))
+            raise
+        _emit(level, caller, args, kwargs, started, result, None)
+        return result
     return wrapper
 
 @log_queries
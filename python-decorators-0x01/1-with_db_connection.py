@@ -1,19 +1,29 @@
 import sqlite3 
 import functools
+import inspect
+from connection_pool import get_async_pool, get_pool
 
 def with_db_connection(func):
     """Decorator that automatically handles database connections"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Borrow an aiosqlite connection from this event loop's pool
+            async with get_async_pool('users.db').connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open database connection
-        conn = sqlite3.connect('users.db')
+        # Borrow a connection from the shared pool
+        conn = get_pool('users.db').acquire()
         try:
             # Pass the connection as the first argument to the decorated function
             result = func(conn, *args, **kwargs)
             return result
         finally:
-            # Ensure the connection is closed even if an error occurs
-            conn.close()
+            # Ensure the connection goes back to the pool even if an error occurs
+            get_pool('users.db').release(conn)
     return wrapper
 
 @with_db_connection 
@@ -1,30 +1,144 @@
 import time
-import sqlite3 
+import random
+import sqlite3
+import asyncio
 import functools
+import inspect
+import threading
+from connection_pool import PoolTimeout
+
+# sqlite3.OperationalError messages that mean "try again later" rather than
+# "this statement is wrong"
+TRANSIENT_MESSAGES = ("database is locked", "database table is locked",
+                      "database is busy", "disk i/o error")
+
+
+def is_transient(exc):
+    """Return True for errors a later attempt may not hit
+
+    Lock contention and busy errors, pool exhaustion and timeouts are
+    transient; syntax errors, constraint violations and the like are not.
+    """
+    if isinstance(exc, sqlite3.OperationalError):
+        message = str(exc).lower()
+        return any(text in message for text in TRANSIENT_MESSAGES)
+    return isinstance(exc, (PoolTimeout, TimeoutError, ConnectionError))
+
+
+class RetryBudget:
+    """Process-wide token bucket limiting how many retries may happen
+
+    Every retry spends one token. Tokens come back at `rate` per second and
+    as a fraction (`ratio`) of each first attempt, up to `capacity`. When
+    the database is failing, retries therefore stay a bounded share of the
+    traffic instead of multiplying it.
+    """
+
+    def __init__(self, capacity=20.0, rate=1.0, ratio=0.1):
+        self.capacity = capacity
+        self.rate = rate
+        self.ratio = ratio
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"deposits": 0, "withdrawals": 0, "exhausted": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def deposit(self):
+        """Credit a first attempt"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+            self._stats["deposits"] += 1
+
+    def withdraw(self):
+        """Spend a token for a retry; return False if none are left"""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                self._stats["exhausted"] += 1
+                return False
+            self._tokens -= 1
+            self._stats["withdrawals"] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return dict(self._stats, tokens=self._tokens)
+
+
+retry_budget = RetryBudget()
+
+
+def retry_on_failure(retries=3, delay=2, max_delay=30.0, backoff=2.0,
+                     deadline=None, budget=None, retry_on=is_transient):
+    """Decorator that retries database operations on transient failures
+
+    Waits a random time between 0 and min(max_delay, delay * backoff ** n)
+    before retry n + 1 (exponential backoff with full jitter), so clients
+    that failed together do not retry together. Gives up after `retries`
+    attempts, when the next wait would end more than `deadline` seconds
+    after the first attempt started, when `budget` (the process-wide
+    retry_budget by default) is exhausted, or at once for errors
+    `retry_on` does not accept.
+    """
+    def pause_before_retry(e, attempt, started):
+        # Seconds to wait before the next attempt, or None to give up
+        print(f"Attempt {attempt} failed: {e}")
+        if not retry_on(e):
+            print("Error is not transient; not retrying")
+            return None
+        if attempt >= retries:
+            print(f"All {retries} attempts failed")
+            return None
+        pause = random.uniform(0, min(max_delay, delay * backoff ** (attempt - 1)))
+        if deadline is not None and time.monotonic() - started + pause > deadline:
+            print(f"Retry deadline of {deadline} seconds reached")
+            return None
+        if not (retry_budget if budget is None else budget).withdraw():
+            print("Retry budget exhausted; not retrying")
+            return None
+        print(f"Retrying in {pause:.2f} seconds...")
+        return pause
 
-def retry_on_failure(retries=3, delay=2):
-    """Decorator that retries database operations on failure"""
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                (retry_budget if budget is None else budget).deposit()
+                started = time.monotonic()
+                attempt = 0
+                while True:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        attempt += 1
+                        pause = pause_before_retry(e, attempt, started)
+                        if pause is None:
+                            raise
+                        # Back off without blocking the event loop
+                        await asyncio.sleep(pause)
+            return async_wrapper
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            (retry_budget if budget is None else budget).deposit()
+            started = time.monotonic()
             attempt = 0
-            last_exception = None
-            
-            while attempt < retries:
+            while True:
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
                     attempt += 1
-                    last_exception = e
-                    print(f"Attempt {attempt} failed: {e}")
-                    
-                    if attempt < retries:
-                        print(f"Retrying in {delay} seconds...")
-                        time.sleep(delay)
-                    else:
-                        print(f"All {retries} attempts failed")
-                        raise last_exception
-            
-            return func(*args, **kwargs)
+                    pause = pause_before_retry(e, attempt, started)
+                    if pause is None:
+                        raise
+                    time.sleep(pause)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -1,35 +1,389 @@
+import asyncio
 import time
-import sqlite3 
+import sqlite3
 import functools
+import inspect
+import operator
+import re
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import db_events
+from singleflight import flights
 
-query_cache = {}
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+# Connection arguments are not part of a cache key
+_CONNECTION_TYPES = (sqlite3.Connection,) if aiosqlite is None else (
+    sqlite3.Connection, aiosqlite.Connection)
+
+
+class QueryCache:
+    """Bounded query result cache with LRU eviction and per-entry TTL
+
+    Entries are evicted least recently used first whenever the cache holds
+    more than `max_entries` results or more than `max_bytes` (an estimate of
+    the results' in-memory size). Expired entries are dropped when looked up.
+
+    Each entry records the tables its query read. When a transaction run
+    through @transactional commits, only the entries reading a table it
+    modified are evicted.
+    """
+
+    # Methods only take an in-memory lock briefly, so async callers may use
+    # them directly on the event loop
+    blocking = False
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # table -> keys of the entries that read it
+        self._by_table = {}
+        # table -> number of times it has been invalidated
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "rejected": 0, "invalidations": 0}
+        db_events.on_commit(self.invalidate_tables)
+
+    @contextmanager
+    def flight(self, key):
+        """Guard the computation of a missing result across processes
+
+        Nothing to do for an in-process cache: cache_query already coalesces
+        concurrent misses in this process through singleflight.
+        """
+        yield
+
+    def get(self, key, record=True):
+        """Return (True, result) on a hit, (False, None) on a miss
+
+        record=False leaves the hit/miss counters alone (for re-checks).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at, _ = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    if record:
+                        self._stats["hits"] += 1
+                    return True, value
+                self._remove(key)
+                self._stats["expirations"] += 1
+            if record:
+                self._stats["misses"] += 1
+            return False, None
+
+    def table_versions(self, tables):
+        """Snapshot to pass to set() so a result computed while one of its
+        tables was being invalidated is not stored
+
+        Only the query's own tables count; a query whose tables could not
+        be parsed reads ALL_TABLES, which every commit bumps.
+        """
+        with self._lock:
+            return tuple(self._versions.get(t, 0) for t in sorted(tables))
+
+    def set(self, key, value, ttl=None, tables=(), versions=None):
+        """Store a result, evicting least recently used entries to fit
+
+        `tables` are the tables the query read; `versions` is the result of
+        table_versions(tables) taken before the query ran.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        size = estimate_size(value)
+        tables = frozenset(tables)
+        with self._lock:
+            if versions is not None and versions != tuple(
+                    self._versions.get(t, 0) for t in sorted(tables)):
+                # A write committed while the query ran; the result may be stale
+                self._stats["rejected"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # A single result larger than the whole budget is not cached
+                self._stats["rejected"] += 1
+                return
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, size, expires_at, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while (len(self._entries) > self.max_entries
+                   or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        """Drop one entry if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_tables(self, tables):
+        """Drop every entry that read any of `tables`"""
+        with self._lock:
+            keys = set()
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                keys |= self._by_table.get(table, set())
+            # Queries whose tables could not be parsed depend on every table
+            self._versions[db_events.ALL_TABLES] = \
+                self._versions.get(db_events.ALL_TABLES, 0) + 1
+            keys |= self._by_table.get(db_events.ALL_TABLES, set())
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries),
+                         bytes=self._bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+def estimate_size(value, _seen=None):
+    """Rough in-memory size of a query result (rows of plain values)"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen)
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    return size
+
+
+_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_query(query):
+    """Collapse whitespace outside string literals and drop a trailing ';'"""
+    query = _TOKENS.sub(lambda m: m.group(1) or " ", query).strip()
+    return query.rstrip(";").rstrip()
+
+
+_ATOMIC = frozenset((str, int, float, bool, bytes, type(None)))
+
+
+def _freeze(value):
+    """Turn bound parameter values into something hashable"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+_READ_QUERY = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+
+
+def _is_read_query(value):
+    return isinstance(value, str) and _READ_QUERY.match(value) is not None
+
+
+def _binder(signature):
+    """Return a fast function mapping (args, kwargs) to bound arguments
+
+    Plain positional-or-keyword signatures are bound by hand, which is far
+    cheaper than Signature.bind on the cache hit path; anything else falls
+    back to Signature.bind.
+    """
+    params = list(signature.parameters.values())
+    if any(p.kind is not p.POSITIONAL_OR_KEYWORD for p in params):
+        def bind(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return bound.arguments
+        return bind
+
+    names = tuple(p.name for p in params)
+    known = frozenset(names)
+    defaults = {p.name: p.default for p in params
+                if p.default is not p.empty}
+
+    def bind(args, kwargs):
+        if len(args) > len(names):
+            raise TypeError("too many positional arguments")
+        arguments = dict(zip(names, args))
+        for name, value in kwargs.items():
+            if name not in known or name in arguments:
+                raise TypeError(f"unexpected or duplicate argument {name!r}")
+            arguments[name] = value
+        if len(arguments) < len(names):
+            for name in names:
+                if name not in arguments:
+                    if name not in defaults:
+                        raise TypeError(f"missing argument {name!r}")
+                    arguments[name] = defaults[name]
+        return arguments
+    return bind
+
+
+def make_cache_key(bind, args, kwargs):
+    """Build the cache key (normalized query, bound parameters) for a call
+
+    The query is the `query` argument, or failing that the first string
+    argument that is a SELECT. Every other argument except the database
+    connection is part of the key. Returns None if the call is not a
+    cacheable read query.
+    """
+    try:
+        arguments = bind(args, kwargs)
+    except TypeError:
+        return None
+
+    query_name = "query" if _is_read_query(arguments.get("query")) else None
+    if query_name is None:
+        query_name = next((name for name, value in arguments.items()
+                           if _is_read_query(value)), None)
+    if query_name is None:
+        return None
+
+    try:
+        # Freezing sorts dict items, which fails for mixed key types; such
+        # calls, like unhashable ones, run uncached
+        params = [(name, value if type(value) in _ATOMIC else _freeze(value))
+                  for name, value in arguments.items()
+                  if name != query_name
+                  and not isinstance(value, _CONNECTION_TYPES)]
+        # Keyword arguments may arrive in any order
+        params.sort(key=operator.itemgetter(0))
+        key = (normalize_query(arguments[query_name]), tuple(params))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+query_cache = QueryCache()
+
+
+def cache_query(func=None, *, cache=None, ttl=None):
+    """Decorator that caches database query results
+
+    Usable bare (@cache_query) or with options (@cache_query(ttl=30)).
+    Results are stored in `cache` (the module-wide query_cache by default)
+    under the normalized query text plus the call's other arguments.
+    """
+    if func is None:
+        return functools.partial(cache_query, cache=cache, ttl=ttl)
+
+    bind = _binder(inspect.signature(func))
+
+    if inspect.iscoroutinefunction(func):
+        return _async_cache_query(func, bind, cache, ttl)
 
-def cache_query(func):
-    """Decorator that caches database query results"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Extract the query from arguments (assuming it's the first arg or keyword 'query')
-        query = None
-        
-        # Check if query is passed as a positional argument
-        if args and isinstance(args[0], str) and args[0].strip().upper().startswith('SELECT'):
-            query = args[0]
-        # Check if query is passed as a keyword argument
-        elif 'query' in kwargs:
-            query = kwargs['query']
-        
-        # If we found a query and it's in cache, return cached result
-        if query and query in query_cache:
-            print(f"Using cached result for query: {query}")
-            return query_cache[query]
-        
-        # If not in cache or not a query, execute the function
-        result = func(*args, **kwargs)
-        
-        # Cache the result if it's a query
-        if query:
-            print(f"Caching result for query: {query}")
-            query_cache[query] = result
-        
-        return result
-    return wrapper
\ No newline at end of file
+        store = query_cache if cache is None else cache
+        key = make_cache_key(bind, args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+
+        # If the query is in the cache and still fresh, return the cached result
+        hit, result = store.get(key)
+        if hit:
+            return result
+
+        # If not in cache, execute the function and cache the result
+        def compute():
+            with store.flight(key):
+                # Another process may have filled it while we waited
+                hit, result = store.get(key, record=False)
+                if hit:
+                    return result
+                tables = db_events.tables_read(key[0])
+                versions = store.table_versions(tables)
+                result = func(*args, **kwargs)
+                store.set(key, result, ttl, tables, versions)
+                return result
+
+        # Concurrent misses on the same key share a single execution
+        return flights.do((id(store), key), compute)
+    return wrapper
+
+
+async def _call(store, method, *args, **kwargs):
+    """Call a cache method, off the event loop if the store does I/O"""
+    if store.blocking:
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+
+def _async_cache_query(func, bind, cache, ttl):
+    """cache_query for coroutine functions
+
+    Misses are coalesced per event loop with SingleFlight.do_async, and a
+    store that does file I/O (SQLiteCache) is called from a worker thread so
+    lookups and lease waits never block the loop.
+    """
+    @functools.wraps(func)
+    async def async_wrapper(*args, **kwargs):
+        store = query_cache if cache is None else cache
+        key = make_cache_key(bind, args, kwargs)
+        if key is None:
+            return await func(*args, **kwargs)
+
+        hit, result = await _call(store, store.get, key)
+        if hit:
+            return result
+
+        async def compute():
+            flight = store.flight(key)
+            await _call(store, flight.__enter__)
+            try:
+                hit, result = await _call(store, store.get, key, record=False)
+                if hit:
+                    return result
+                tables = db_events.tables_read(key[0])
+                versions = await _call(store, store.table_versions, tables)
+                result = await func(*args, **kwargs)
+                await _call(store, store.set, key, result, ttl, tables, versions)
+                return result
+            finally:
+                await _call(store, flight.__exit__, None, None, None)
+
+        return await flights.do_async((id(store), key), compute)
+    return async_wrapper
@@ -0,0 +1,224 @@
+import time
+import functools
+import inspect
+import threading
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling through while a circuit is open"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing database until it has had time to recover
+
+    CLOSED: calls go through; the outcomes of the last `window` calls are
+    kept, and once at least `min_calls` are recorded and the share of
+    failures reaches `failure_rate` the circuit opens.
+
+    OPEN: calls fail at once with CircuitOpenError. After `reset_timeout`
+    seconds the circuit goes half-open.
+
+    HALF_OPEN: up to `half_open_calls` trial calls go through (others are
+    rejected). If they all succeed the circuit closes; any failure opens it
+    again.
+
+    Exceptions for which `is_failure` returns False (a caller's own bad
+    query, say) do not count against the database.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_rate=0.5, window=20, min_calls=10,
+                 reset_timeout=30.0, half_open_calls=1, is_failure=None):
+        if not 0 < failure_rate <= 1:
+            raise ValueError("failure_rate must be in (0, 1]")
+        if not 1 <= min_calls <= window:
+            raise ValueError("min_calls must be between 1 and window")
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure or (lambda exc: True)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failure
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self._stats = {"calls": 0, "successes": 0, "failures": 0,
+                       "rejected": 0}
+        self._transitions = {}
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _transition(self, state):
+        # Caller holds the lock
+        key = f"{self._state}->{state}"
+        self._transitions[key] = self._transitions.get(key, 0) + 1
+        self._state = state
+        self._outcomes.clear()
+        self._failures = 0
+        self._trials = 0
+        self._trial_successes = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+
+    def _maybe_half_open(self, now):
+        if (self._state == self.OPEN
+                and now - self._opened_at >= self.reset_timeout):
+            self._transition(self.HALF_OPEN)
+
+    def _before_call(self):
+        """Let a call through or raise CircuitOpenError"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == self.OPEN or (
+                    self._state == self.HALF_OPEN
+                    and self._trials >= self.half_open_calls):
+                self._stats["rejected"] += 1
+                retry_in = max(0.0, self._opened_at + self.reset_timeout
+                               - time.monotonic())
+                raise CircuitOpenError(
+                    f"Circuit {self.name!r} is {self._state}; "
+                    f"retry in {retry_in:.1f}s")
+            if self._state == self.HALF_OPEN:
+                self._trials += 1
+            self._stats["calls"] += 1
+            return self._state
+
+    def _record(self, admitted_in, failed):
+        with self._lock:
+            self._stats["failures" if failed else "successes"] += 1
+            if admitted_in != self._state:
+                # The circuit moved on while this call ran; its outcome
+                # belongs to the previous state
+                return
+            if self._state == self.HALF_OPEN:
+                if failed:
+                    self._transition(self.OPEN)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        self._transition(self.CLOSED)
+                return
+            if len(self._outcomes) == self._outcomes.maxlen:
+                self._failures -= self._outcomes[0]
+            self._outcomes.append(failed)
+            self._failures += failed
+            if (len(self._outcomes) >= self.min_calls
+                    and self._failures / len(self._outcomes) >= self.failure_rate):
+                self._transition(self.OPEN)
+
+    def _abandon(self, admitted_in):
+        # A cancelled call frees its trial slot without an outcome
+        with self._lock:
+            if admitted_in == self.HALF_OPEN == self._state:
+                self._trials -= 1
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker"""
+        admitted_in = self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._record(admitted_in, self.is_failure(e))
+            raise
+        except BaseException:
+            self._abandon(admitted_in)
+            raise
+        self._record(admitted_in, False)
+        return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """Await func(*args, **kwargs) through the breaker"""
+        admitted_in = self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            self._record(admitted_in, self.is_failure(e))
+            raise
+        except BaseException:
+            self._abandon(admitted_in)
+            raise
+        self._record(admitted_in, False)
+        return result
+
+    def reset(self):
+        """Force the circuit closed"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def stats(self):
+        """Call counters, current failure rate and state transition counts"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            recorded = len(self._outcomes)
+            return dict(self._stats, name=self.name, state=self._state,
+                        failure_rate=(self._failures / recorded
+                                      if recorded else 0.0),
+                        transitions=dict(self._transitions))
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **options):
+    """Return the breaker called `name`, creating it on first use
+
+    Options only take effect when the breaker is created.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **options)
+        return breaker
+
+
+def breaker_stats():
+    """stats() of every named breaker"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def circuit_breaker(name=None, **options):
+    """Decorator that calls a function through a named CircuitBreaker
+
+    Functions hitting the same database should share a name, so they trip
+    together; by default each function gets its own breaker. Works on plain
+    and coroutine functions.
+
+    Composes with retry_on_failure either way round. Outside it, a whole
+    retried call counts once and an open circuit skips the retries. Inside
+    it, every attempt counts, and CircuitOpenError is not transient, so the
+    retries stop as soon as the circuit opens.
+    """
+    def decorator(func):
+        breaker = get_breaker(name or f"{func.__module__}.{func.__qualname__}",
+                              **options)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await breaker.call_async(func, *args, **kwargs)
+            async_wrapper.breaker = breaker
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return breaker.call(func, *args, **kwargs)
+        wrapper.breaker = breaker
+        return wrapper
+    return decorator
@@ -0,0 +1,356 @@
+import time
+import sqlite3
+import functools
+import inspect
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from connection_pool import PoolTimeout, get_pool
+from fingerprint import fingerprint, is_transaction_control
+import db_events
+
+# Propagates to the "queries" logger, so when 0-log_queries is in use slow
+# queries are written by its background thread too
+slow_logger = logging.getLogger("queries.slow")
+logger = logging.getLogger("queries.metrics")
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies in microseconds
+
+    Values below 128us get a bucket each; above that every power-of-two
+    range is split into 64 buckets, so any recorded value is within about
+    1.6% of its bucket's bounds however large it is. Recording is a few
+    integer operations and a dict update; memory grows with the number of
+    distinct buckets, not with the number of values.
+    """
+
+    SUB_BITS = 7
+    SUB_COUNT = 1 << SUB_BITS
+    HALF_COUNT = SUB_COUNT >> 1
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value):
+        if value < cls.SUB_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BITS
+        return shift * cls.HALF_COUNT + (value >> shift)
+
+    @classmethod
+    def _upper_bound(cls, index):
+        # Highest value that falls in bucket `index`
+        if index < cls.SUB_COUNT:
+            return index
+        shift = (index - cls.SUB_COUNT) // cls.HALF_COUNT + 1
+        sub = index - shift * cls.HALF_COUNT
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value):
+        value = int(value)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Value at or below which `p` percent of the recorded values fall"""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class _Series:
+    __slots__ = ("latency", "rows", "errors", "slow")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+
+
+class QueryMetrics:
+    """Latency, row and error counts per (function, query fingerprint)"""
+
+    PERCENTILES = (50, 90, 99, 99.9)
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, function, fp, seconds, rows=0, error=False, slow=False):
+        key = (function, fp)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.latency.record(seconds * 1e6)
+            series.rows += rows
+            series.errors += error
+            series.slow += slow
+
+    def snapshot(self):
+        """{function: {fingerprint: stats}} with latencies in milliseconds"""
+        with self._lock:
+            items = [(key, series.latency.count, series.latency.mean(),
+                      series.latency.min or 0, series.latency.max,
+                      [series.latency.percentile(p) for p in self.PERCENTILES],
+                      series.rows, series.errors, series.slow)
+                     for key, series in self._series.items()]
+        snapshot = {}
+        for ((function, fp), count, mean, low, high, percentiles,
+             rows, errors, slow) in items:
+            stats = {"count": count, "errors": errors, "slow": slow,
+                     "rows": rows, "mean_ms": mean / 1000,
+                     "min_ms": low / 1000, "max_ms": high / 1000}
+            for p, value in zip(self.PERCENTILES, percentiles):
+                stats[f"p{p:g}_ms"] = value / 1000
+            snapshot.setdefault(function, {})[fp] = stats
+        return snapshot
+
+    def to_prometheus(self, prefix="db_query"):
+        """Prometheus text exposition of the current metrics"""
+        lines = [
+            f"# HELP {prefix}_duration_seconds Latency of decorated database calls",
+            f"# TYPE {prefix}_duration_seconds summary",
+        ]
+        rows, errors, slow = [], [], []
+        for function, by_fp in sorted(self.snapshot().items()):
+            for fp, stats in sorted(by_fp.items()):
+                labels = (f'function="{_escape(function)}",'
+                          f'fingerprint="{_escape(fp)}"')
+                for p in self.PERCENTILES:
+                    lines.append(
+                        f'{prefix}_duration_seconds{{{labels},quantile="{p / 100:g}"}} '
+                        f'{stats[f"p{p:g}_ms"] / 1000:.6g}')
+                lines.append(f"{prefix}_duration_seconds_sum{{{labels}}} "
+                             f"{stats['mean_ms'] * stats['count'] / 1000:.6g}")
+                lines.append(f"{prefix}_duration_seconds_count{{{labels}}} "
+                             f"{stats['count']}")
+                rows.append(f"{prefix}_rows_total{{{labels}}} {stats['rows']}")
+                errors.append(f"{prefix}_errors_total{{{labels}}} {stats['errors']}")
+                slow.append(f"{prefix}_slow_total{{{labels}}} {stats['slow']}")
+        for name, help_text, samples in (
+                ("rows_total", "Rows returned by decorated database calls", rows),
+                ("errors_total", "Decorated database calls that raised", errors),
+                ("slow_total", "Decorated database calls over the slow threshold", slow)):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+query_metrics = QueryMetrics()
+
+# fingerprint -> EXPLAIN QUERY PLAN text, so each slow query shape is only
+# explained once
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+MAX_PLANS = 256
+# How long explain() waits for a pooled connection before giving up
+EXPLAIN_TIMEOUT = 1.0
+
+
+def explain(sql, database='users.db'):
+    """EXPLAIN QUERY PLAN for `sql` as indented text, cached per fingerprint"""
+    fp = fingerprint(sql)
+    with _plans_lock:
+        plan = _plans.get(fp)
+        if plan is not None:
+            _plans.move_to_end(fp)
+            return plan
+    pool = get_pool(database)
+    try:
+        conn = pool.acquire(EXPLAIN_TIMEOUT)
+    except PoolTimeout as e:
+        return f"(no plan: {e})"
+    try:
+        with db_events.untracked():
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    except sqlite3.Error as e:
+        return f"(no plan: {e})"
+    finally:
+        pool.release(conn)
+    # Rows are (id, parent, notused, detail); indent children under parents
+    depth = {0: 0}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, 0) + 1
+        lines.append("  " * depth[node] + detail)
+    plan = "\n".join(lines)
+    with _plans_lock:
+        _plans[fp] = plan
+        if len(_plans) > MAX_PLANS:
+            _plans.popitem(last=False)
+    return plan
+
+
+# Slow calls waiting to be explained and logged by the reporter thread;
+# when it falls this far behind, further slow calls are counted, not logged
+SLOW_QUEUE_SIZE = 1000
+_slow_calls = queue.Queue(maxsize=SLOW_QUEUE_SIZE)
+_slow_dropped = 0
+_reporter = None
+_reporter_lock = threading.Lock()
+
+
+def slow_log_stats():
+    """Slow calls waiting to be logged, and those dropped as the queue was
+    full"""
+    with _reporter_lock:
+        dropped = _slow_dropped
+    return {"queued": _slow_calls.qsize(), "dropped": dropped}
+
+
+def _report_slow_calls():
+    while True:
+        name, sqls, seconds, error, explain_slow, database = _slow_calls.get()
+        try:
+            parts = [f"Slow query in {name}: {seconds * 1000:.1f}ms"
+                     + (" (raised)" if error else "")]
+            # Statements carry their parameter values (emails and the like);
+            # only their fingerprints are logged
+            shapes = {}
+            for sql in sqls:
+                shapes.setdefault(fingerprint(sql), sql)
+            for fp, sql in shapes.items():
+                parts.append(f"  {fp}")
+                if explain_slow:
+                    parts.append(explain(sql, database))
+            slow_logger.warning("\n".join(parts))
+        except Exception:
+            logger.exception("Reporting a slow query failed")
+
+
+def _queue_slow_call(*call):
+    """Hand a slow call to the reporter thread, starting it on first use
+
+    EXPLAIN needs a pooled connection, and the database is most likely to
+    be busy exactly when calls are slow, so it never runs on the caller's
+    thread. If the reporter is SLOW_QUEUE_SIZE calls behind, the call is
+    dropped and counted in slow_log_stats().
+    """
+    global _reporter, _slow_dropped
+    if _reporter is None:
+        with _reporter_lock:
+            if _reporter is None:
+                _reporter = threading.Thread(target=_report_slow_calls,
+                                             name="slow-query-log",
+                                             daemon=True)
+                _reporter.start()
+    try:
+        _slow_calls.put_nowait(call)
+    except queue.Full:
+        with _reporter_lock:
+            _slow_dropped += 1
+
+
+def _count_rows(result):
+    # A list is a fetchall(), None a missing fetchone(), anything else one row
+    if isinstance(result, list):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def _query_argument(args, kwargs):
+    query = kwargs.get('query', args[0] if args else None)
+    return query if isinstance(query, str) else None
+
+
+def timed_query(func=None, *, metrics=None, slow_ms=100.0, explain_slow=True,
+                database='users.db'):
+    """Decorator recording latency, rows returned and errors per query
+
+    Calls are grouped by function and by the fingerprint of the SQL they
+    ran: the statements executed on pooled connections during the call,
+    or failing that the `query` argument. Calls slower than `slow_ms` are
+    logged to the "queries.slow" logger with each statement's fingerprint
+    (never its parameter values) and EXPLAIN QUERY PLAN, from a background
+    thread. Errors in recording are
+    logged and never reach the caller. Metrics go to `metrics` (the module-wide
+    query_metrics by default); see QueryMetrics.snapshot and
+    to_prometheus.
+
+    Works on coroutine functions too; aiosqlite runs statements on its own
+    thread, where they cannot be collected, so those are grouped by the
+    `query` argument only.
+    """
+    if func is None:
+        return functools.partial(timed_query, metrics=metrics, slow_ms=slow_ms,
+                                 explain_slow=explain_slow, database=database)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    def observe(args, kwargs, statements, seconds, result, error):
+        try:
+            sqls = [sql for sql in statements
+                    if not is_transaction_control(sql)]
+            if not sqls:
+                query = _query_argument(args, kwargs)
+                sqls = [query] if query else []
+            fp = "; ".join(dict.fromkeys(fingerprint(sql) for sql in sqls))
+            slow = seconds * 1000 >= slow_ms
+            store = query_metrics if metrics is None else metrics
+            store.record(name, fp or "(no statements)", seconds,
+                         0 if error else _count_rows(result), error, slow)
+            if slow:
+                _queue_slow_call(name, sqls, seconds, error, explain_slow,
+                                 database)
+        except Exception:
+            logger.exception("Recording query metrics for %s failed", name)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                observe(args, kwargs, (), time.perf_counter() - started, None, True)
+                raise
+            observe(args, kwargs, (), time.perf_counter() - started, result, False)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_events.collect_statements() as statements:
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                observe(args, kwargs, statements,
+                        time.perf_counter() - started, None, True)
+                raise
+            observe(args, kwargs, statements,
+                    time.perf_counter() - started, result, False)
+            return result
+    return wrapper
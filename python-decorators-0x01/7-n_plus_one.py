@@ -0,0 +1,198 @@
+import re
+import functools
+import inspect
+import logging
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fingerprint import fingerprint, is_select
+import db_events
+
+# A query shape run this many times in one scope is reported as N+1
+N_PLUS_ONE_THRESHOLD = 10
+
+logger = logging.getLogger("queries.n_plus_one")
+
+# The scope of the current logical request, if any
+_scope = ContextVar("query_scope", default=None)
+
+# Most recent findings across all scopes
+recent_findings = deque(maxlen=100)
+
+_SINGLE_KEY = re.compile(r"\b([\w.\"`\[\]]+) = \?")
+
+
+def batch_suggestion(fp):
+    """Suggest the batched form of a single-row SELECT fingerprint
+
+    The first `column = ?` predicate after WHERE becomes `column in (?+)`;
+    returns None when there is no such predicate.
+    """
+    if not is_select(fp):
+        return None
+    head, where, predicates = fp.partition(" where ")
+    if not where or not _SINGLE_KEY.search(predicates):
+        return None
+    return head + where + _SINGLE_KEY.sub(r"\1 in (?+)", predicates, count=1)
+
+
+class QueryScope:
+    """Counts of the query fingerprints run in one logical request
+
+    Only SELECTs are counted. Writes repeated in a loop belong in
+    executemany, and sqlite3 reports every row of an executemany as a
+    separate statement, so counting writes would flag exactly the batched
+    code this is meant to encourage.
+
+    Statements are fingerprinted as they run and only a count and the
+    first example of each fingerprint are kept, so a long job or bulk loop
+    in one scope uses memory per query shape, not per statement.
+    """
+
+    def __init__(self, name, threshold):
+        self.name = name
+        self.threshold = threshold
+        self.counts = Counter()
+        # fingerprint -> first statement seen with it
+        self.examples = {}
+        # fingerprint -> names of the @track_queries functions that ran it
+        self.callers = {}
+        self.findings = []
+
+    def add(self, sql, caller=None):
+        if not is_select(sql):
+            return
+        fp = fingerprint(sql)
+        self.counts[fp] += 1
+        if fp not in self.examples:
+            self.examples[fp] = sql
+        if caller is not None:
+            self.callers.setdefault(fp, set()).add(caller)
+
+    # Sink for db_events.collect_statements: count statements as they run
+    def append(self, sql):
+        self.add(sql)
+
+    def extend(self, sqls):
+        for sql in sqls:
+            self.add(sql)
+
+    def attribute(self, sql, caller):
+        # Statements are counted when the scope closes; only note who ran it
+        self.callers.setdefault(fingerprint(sql), set()).add(caller)
+
+    def check(self):
+        """Record and log every fingerprint at or over the threshold"""
+        for fp, count in self.counts.most_common():
+            if count < self.threshold:
+                break
+            finding = {
+                "scope": self.name,
+                "fingerprint": fp,
+                "count": count,
+                "example": self.examples.get(fp),
+                "callers": sorted(self.callers.get(fp, ())),
+                "suggestion": batch_suggestion(fp),
+            }
+            self.findings.append(finding)
+            recent_findings.append(finding)
+            message = (f"Possible N+1 in {self.name}: {count} executions of "
+                       f"{fp!r}")
+            if finding["callers"]:
+                message += f" from {', '.join(finding['callers'])}"
+            if finding["suggestion"]:
+                message += f"; batch as {finding['suggestion']!r}"
+            logger.warning(message)
+        return self.findings
+
+
+@contextmanager
+def request_scope(name="request", threshold=None):
+    """Count the queries run inside the block as one logical request
+
+    Statements on pooled (traced) connections are counted by fingerprint
+    as they run; when the block exits, any fingerprint run at least
+    `threshold` times (N_PLUS_ONE_THRESHOLD by default) is logged to
+    "queries.n_plus_one" and added to the scope's findings. A scope opened
+    inside another joins the outer one.
+    """
+    current = _scope.get()
+    if current is not None:
+        yield current
+        return
+    scope = QueryScope(name, N_PLUS_ONE_THRESHOLD if threshold is None
+                       else threshold)
+    token = _scope.set(scope)
+    try:
+        with db_events.collect_statements(into=scope):
+            yield scope
+    finally:
+        _scope.reset(token)
+        scope.check()
+
+
+def n_plus_one_scope(func=None, *, threshold=None):
+    """Decorator that runs each call as a request_scope named after the
+    function (handlers, jobs, views); works on coroutine functions too"""
+    if func is None:
+        return functools.partial(n_plus_one_scope, threshold=threshold)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with request_scope(name, threshold):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with request_scope(name, threshold):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _query_argument(args, kwargs):
+    query = kwargs.get('query', args[0] if args else None)
+    return query if isinstance(query, str) else None
+
+
+def track_queries(func):
+    """Decorator for data-access functions such as get_user_by_id
+
+    Inside a request scope, findings name the tracked functions that ran
+    each query. A function whose statements are not traced (its own
+    sqlite3 connection, or aiosqlite) is counted by its `query` argument.
+    Outside a scope it only calls through.
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            scope = _scope.get()
+            if scope is not None:
+                query = _query_argument(args, kwargs)
+                if query is not None:
+                    scope.add(query, name)
+            return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        scope = _scope.get()
+        if scope is None:
+            return func(*args, **kwargs)
+        with db_events.collect_statements() as statements:
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sqls = [sql for sql in statements if is_select(sql)]
+                if sqls:
+                    for sql in dict.fromkeys(sqls):
+                        scope.attribute(sql, name)
+                else:
+                    query = _query_argument(args, kwargs)
+                    if query is not None:
+                        scope.add(query, name)
+    return wrapper
@@ -0,0 +1,43 @@
+"""
+Benchmark: hit-path latency of cache_query.
+
+Usage: python bench_cache_query.py [calls]
+"""
+import sys
+import time
+cache_module = __import__('4-cache_query')
+
+
+def per_call_us(label, run, calls):
+    """Run `run` `calls` times and print the mean latency in microseconds"""
+    start = time.perf_counter()
+    for i in range(calls):
+        run(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / calls * 1e6:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rows = [(i, f"user{i}", f"user{i}@example.com", 20 + i % 60)
+            for i in range(100)]
+    cache = cache_module.QueryCache(max_entries=1000)
+
+    @cache_module.cache_query(cache=cache)
+    def fetch_users(conn, query, min_age=0):
+        return rows
+
+    plain = {}
+
+    def dict_lookup(i):
+        return plain.get(("SELECT * FROM users WHERE age > ?", i % 100))
+
+    per_call_us("baseline: plain dict lookup", dict_lookup, calls)
+    per_call_us("cache_query hit, positional args",
+                lambda i: fetch_users(None, "SELECT * FROM users WHERE age > ?",
+                                      i % 100), calls)
+    per_call_us("cache_query hit, keyword args",
+                lambda i: fetch_users(conn=None, min_age=i % 100,
+                                      query="SELECT * FROM users WHERE age > ?"),
+                calls)
+    print(cache.stats())
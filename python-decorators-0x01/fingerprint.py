@@ -0,0 +1,43 @@
+import re
+from functools import lru_cache
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'|[xX]'[0-9a-fA-F]*'")
+_NUMBERS = re.compile(r"(?<![\w$.])[-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+|0[xX][0-9a-fA-F]+)\b")
+_PLACEHOLDERS = re.compile(r"\?\d*|[:@$][A-Za-z_]\w*")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_SPACE = re.compile(r"\s+")
+_SELECT = re.compile(r"\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+_CONTROL = re.compile(
+    r"\s*(?:BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Reduce a statement to its shape, independent of the values in it
+
+    Literals and placeholders become '?', lists of them become '(?+)' so
+    IN lists and multi-row VALUES of any length match, comments go, and
+    whitespace and case are normalised:
+
+        SELECT * FROM users WHERE id = 42      -> select * from users where id = ?
+        SELECT * FROM users WHERE id IN (1, 2) -> select * from users where id in (?+)
+    """
+    sql = _COMMENTS.sub(" ", sql)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PLACEHOLDERS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _LISTS.sub("(?+)", sql)
+    sql = _ROWS.sub("(?+)", sql)
+    return _SPACE.sub(" ", sql).strip().rstrip(";").rstrip().lower()
+
+
+def is_select(sql):
+    """True for queries (SELECT or WITH ... SELECT)"""
+    return _SELECT.match(sql) is not None
+
+
+def is_transaction_control(sql):
+    """True for BEGIN/COMMIT/ROLLBACK/SAVEPOINT/RELEASE and PRAGMA statements"""
+    return _CONTROL.match(sql) is not None
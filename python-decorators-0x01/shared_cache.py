@@ -0,0 +1,289 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+import db_events
+
+# Results at least this large are zlib-compressed before being stored
+COMPRESS_THRESHOLD = 1024
+
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+def dumps(value):
+    """Compact serialization: pickle, zlib-compressed when large"""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_THRESHOLD:
+        packed = zlib.compress(data, 1)
+        if len(packed) < len(data):
+            return _ZLIB + packed
+    return _RAW + data
+
+
+def loads(blob):
+    data = blob[1:]
+    if blob[:1] == _ZLIB:
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+def _canonical(value):
+    """Rebuild a cache key so its repr is the same in every process
+
+    Set and dict iteration order depends on per-process string hash
+    randomisation, so their items are sorted; pickling the key as-is would
+    give each process a different digest for the same query.
+    """
+    if isinstance(value, (set, frozenset)):
+        return ("<set>",) + tuple(sorted((_canonical(v) for v in value),
+                                         key=repr))
+    if isinstance(value, dict):
+        return ("<dict>",) + tuple(sorted(
+            ((_canonical(k), _canonical(v)) for k, v in value.items()),
+            key=repr))
+    if isinstance(value, (tuple, list)):
+        return tuple(_canonical(v) for v in value)
+    return value
+
+
+class SQLiteCache:
+    """Query result cache stored in a SQLite file shared by every process
+
+    A drop-in backend for cache_query(cache=...): workers on one host that
+    point at the same file share hits instead of each keeping a private
+    copy. Entries expire after their TTL; past `max_entries` or `max_bytes`
+    the oldest entries are evicted. Table invalidations from any process's
+    commits are visible to all of them.
+
+    flight() takes a lease row in the file, so when several processes miss
+    on the same key at once only one runs the query; the rest wait for the
+    lease to be released and then read its result.
+    """
+
+    # Every method touches the file; async callers run them in a thread
+    blocking = True
+
+    def __init__(self, path, max_entries=10000, max_bytes=256 * 1024 * 1024,
+                 ttl=300.0, lease_timeout=30.0, poll_interval=0.01):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "rejected": 0, "invalidations": 0,
+                       "lease_waits": 0}
+
+        conn = self._conn()
+        with conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL
+                );
+                CREATE TABLE IF NOT EXISTS entry_tables (
+                    tbl TEXT NOT NULL,
+                    key BLOB NOT NULL,
+                    PRIMARY KEY (tbl, key)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS entry_tables_key ON entry_tables (key);
+                CREATE TABLE IF NOT EXISTS versions (
+                    tbl TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    key BLOB PRIMARY KEY,
+                    expires REAL NOT NULL
+                );
+            """)
+        db_events.on_commit(self.invalidate_tables)
+
+    def _conn(self):
+        """One connection per thread (and per process, for forked workers)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.blake2b(repr(_canonical(key)).encode("utf-8"),
+                               digest_size=16).digest()
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._stats[counter] += n
+
+    def get(self, key, record=True):
+        """Return (True, result) on a hit, (False, None) on a miss"""
+        digest = self._digest(key)
+        row = self._conn().execute(
+            "SELECT value, expires FROM entries WHERE key = ?", (digest,)
+        ).fetchone()
+        if row is not None and (row[1] is None or row[1] > time.time()):
+            if record:
+                self._count("hits")
+            return True, loads(row[0])
+        if row is not None:
+            self.invalidate(key)
+            self._count("expirations")
+        if record:
+            self._count("misses")
+        return False, None
+
+    def _versions(self, conn, tables):
+        # Only the query's own tables; see QueryCache.table_versions
+        names = sorted(tables)
+        found = dict(conn.execute(
+            f"SELECT tbl, version FROM versions WHERE tbl IN "
+            f"({', '.join('?' * len(names))})", names).fetchall())
+        return tuple(found.get(name, 0) for name in names)
+
+    def table_versions(self, tables):
+        """Snapshot to pass to set(); see QueryCache.table_versions"""
+        return self._versions(self._conn(), tables)
+
+    def set(self, key, value, ttl=None, tables=(), versions=None):
+        """Store a result, evicting the oldest entries to fit"""
+        ttl = self.ttl if ttl is None else ttl
+        blob = dumps(value)
+        if len(blob) > self.max_bytes:
+            self._count("rejected")
+            return
+        digest = self._digest(key)
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versions is not None and versions != self._versions(conn, tables):
+                # A write committed while the query ran; the result may be stale
+                conn.execute("ROLLBACK")
+                self._count("rejected")
+                return
+            conn.execute("DELETE FROM entry_tables WHERE key = ?", (digest,))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires) "
+                "VALUES (?, ?, ?, ?)", (digest, blob, len(blob), expires))
+            conn.executemany(
+                "INSERT OR IGNORE INTO entry_tables (tbl, key) VALUES (?, ?)",
+                [(table, digest) for table in tables])
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _evict(self, conn):
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return 0
+        conn.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+        # Trim to 90% of the budget so eviction does not run on every set
+        max_entries, max_bytes = self.max_entries * 0.9, self.max_bytes * 0.9
+        rows = conn.execute(
+            "SELECT key, size FROM entries ORDER BY rowid").fetchall()
+        count, size = len(rows), sum(row[1] for row in rows)
+        victims = []
+        for digest, entry_size in rows:
+            if count <= max_entries and size <= max_bytes:
+                break
+            victims.append((digest,))
+            count -= 1
+            size -= entry_size
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        conn.execute("DELETE FROM entry_tables WHERE key NOT IN "
+                     "(SELECT key FROM entries)")
+        return len(victims)
+
+    def invalidate_tables(self, tables):
+        """Drop every entry that read any of `tables`, in every process"""
+        names = list(tables) + [db_events.ALL_TABLES]
+        marks = ", ".join("?" * len(names))
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO versions (tbl, version) VALUES (?, 1) "
+                "ON CONFLICT (tbl) DO UPDATE SET version = version + 1",
+                [(name,) for name in names])
+            removed = conn.execute(
+                f"DELETE FROM entries WHERE key IN (SELECT key FROM "
+                f"entry_tables WHERE tbl IN ({marks}))", names).rowcount
+            conn.execute(f"DELETE FROM entry_tables WHERE tbl IN ({marks})",
+                         names)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._count("invalidations", removed)
+
+    def invalidate(self, key):
+        digest = self._digest(key)
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE key = ?", (digest,))
+        conn.execute("DELETE FROM entry_tables WHERE key = ?", (digest,))
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM entry_tables")
+
+    @contextmanager
+    def flight(self, key):
+        """Single-flight across processes for one key
+
+        Takes a lease row in the shared file, waiting while another process
+        holds an unexpired lease on the same key. Threads within a process
+        are already coalesced by cache_query through singleflight.
+        """
+        digest = self._acquire_lease(key)
+        try:
+            yield
+        finally:
+            self._conn().execute("DELETE FROM leases WHERE key = ?", (digest,))
+
+    def _acquire_lease(self, key):
+        digest = self._digest(key)
+        conn = self._conn()
+        waited = False
+        while True:
+            now = time.time()
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires <= ?",
+                         (digest, now))
+            taken = conn.execute(
+                "INSERT OR IGNORE INTO leases (key, expires) VALUES (?, ?)",
+                (digest, now + self.lease_timeout)).rowcount
+            if taken:
+                if waited:
+                    self._count("lease_waits")
+                return digest
+            waited = True
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        """This process's hit/miss counters plus the shared file's size"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["entries"], stats["bytes"] = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import inspect
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one execution
+
+    While a call for a key is running, further calls for the same key wait
+    for it and receive its result (or its exception) instead of running
+    again. Works for threads (do) and for coroutines (do_async).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    def do(self, key, fn):
+        """Run fn() unless a call for `key` is already running; share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executions"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, coro_fn):
+        """Await coro_fn() unless a call for `key` is already running
+
+        The shared work runs as its own task, so cancelling one waiter
+        (including the one that started it) does not cancel it for the rest.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(coro_fn())
+                task.add_done_callback(
+                    lambda _: self._forget(task_key, task))
+                self._stats["executions"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, task_key, task):
+        with self._lock:
+            if self._tasks.get(task_key) is task:
+                del self._tasks[task_key]
+
+    def stats(self):
+        """Executions run and duplicate executions avoided"""
+        with self._lock:
+            return dict(self._stats,
+                        in_flight=len(self._calls) + len(self._tasks))
+
+
+flights = SingleFlight()
+
+
+def coalesce(func=None, *, flight=None):
+    """Decorator: concurrent calls with the same arguments share one execution
+
+    Works on plain and coroutine functions. Calls whose arguments are not
+    hashable are run as usual.
+    """
+    if func is None:
+        return functools.partial(coalesce, flight=flight)
+    group = flights if flight is None else flight
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    def make_key(args, kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+            return await group.do_async(key, lambda: func(*args, **kwargs))
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = make_key(args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+        return group.do(key, lambda: func(*args, **kwargs))
+    return wrapper
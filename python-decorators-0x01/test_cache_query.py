@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Unit tests for the 4-cache_query module."""
+
+import importlib
+import inspect
+import sqlite3
+import unittest
+from unittest.mock import Mock, patch
+import db_events
+
+cache_query_module = importlib.import_module("4-cache_query")
+QueryCache = cache_query_module.QueryCache
+cache_query = cache_query_module.cache_query
+make_cache_key = cache_query_module.make_cache_key
+estimate_size = cache_query_module.estimate_size
+
+
+def key_for(func, *args, **kwargs):
+    """Return make_cache_key's key for a call of func."""
+    bind = cache_query_module._binder(inspect.signature(func))
+    return make_cache_key(bind, args, kwargs)
+
+
+def fetch_users(conn, query, params=None):
+    """Query function with the usual (conn, query, params) signature."""
+
+
+class TestQueryCacheBounds(unittest.TestCase):
+    """Test class for QueryCache LRU, TTL and size limits."""
+
+    def setUp(self):
+        """Run the cache on a clock the test moves by hand."""
+        self.now = 1000.0
+        clock = Mock()
+        clock.monotonic.side_effect = lambda: self.now
+        patcher = patch.object(cache_query_module, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that the entry not used for longest goes first."""
+        cache = QueryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), (True, 1))
+        cache.set("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entry_expires_after_ttl(self):
+        """Test that an entry is a miss once its TTL has passed."""
+        cache = QueryCache(ttl=10)
+        cache.set("a", 1)
+        self.now += 9.9
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.now += 0.1
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_per_entry_ttl_and_no_expiry(self):
+        """Test that set()'s ttl overrides the default; 0 never expires."""
+        cache = QueryCache(ttl=10)
+        cache.set("short", 1, ttl=1)
+        cache.set("forever", 2, ttl=0)
+        self.now += 5
+        self.assertEqual(cache.get("short"), (False, None))
+        self.now += 10 ** 6
+        self.assertEqual(cache.get("forever"), (True, 2))
+
+    def test_byte_budget_evicts_oldest(self):
+        """Test that entries are evicted to keep within max_bytes."""
+        rows = {name: [(name * 100,)] for name in "abc"}
+        size = estimate_size(rows["a"])
+        cache = QueryCache(max_bytes=size * 2)
+        for name in "abc":
+            cache.set(name, rows[name])
+
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats()["bytes"], size * 2)
+
+    def test_result_larger_than_budget_is_not_cached(self):
+        """Test that a single oversized result is rejected."""
+        cache = QueryCache(max_bytes=100)
+        cache.set("small", 1)
+        cache.set("huge", ["x" * 1000])
+        self.assertNotIn("huge", cache)
+        self.assertIn("small", cache)
+        self.assertEqual(cache.stats()["rejected"], 1)
+
+
+class TestMakeCacheKey(unittest.TestCase):
+    """Test class for make_cache_key."""
+
+    def test_keyword_and_positional_calls_share_a_key(self):
+        """Test that how arguments are passed does not change the key."""
+        conn = sqlite3.connect(":memory:")
+        self.addCleanup(conn.close)
+        query = "SELECT * FROM users WHERE age > ?"
+        self.assertEqual(key_for(fetch_users, conn, query, (30,)),
+                         key_for(fetch_users, params=(30,), query=query,
+                                 conn=conn))
+
+    def test_parameters_are_part_of_the_key(self):
+        """Test that different parameters give different keys."""
+        query = "SELECT * FROM users WHERE age > ?"
+        self.assertNotEqual(key_for(fetch_users, None, query, (30,)),
+                            key_for(fetch_users, None, query, (40,)))
+
+    def test_query_whitespace_is_normalized(self):
+        """Test that layout outside string literals is ignored."""
+        self.assertEqual(
+            key_for(fetch_users, None, "SELECT *\n  FROM users;"),
+            key_for(fetch_users, None, "SELECT * FROM users"))
+        self.assertNotEqual(
+            key_for(fetch_users, None, "SELECT * FROM users WHERE name = 'a  b'"),
+            key_for(fetch_users, None, "SELECT * FROM users WHERE name = 'a b'"))
+
+    def test_connection_is_not_part_of_the_key(self):
+        """Test that calls on different connections share a key."""
+        first, second = sqlite3.connect(":memory:"), sqlite3.connect(":memory:")
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        self.assertEqual(key_for(fetch_users, first, "SELECT 1"),
+                         key_for(fetch_users, second, "SELECT 1"))
+
+    def test_container_parameters_are_frozen(self):
+        """Test that lists, sets and dicts make equal keys for equal values."""
+        query = "SELECT * FROM users WHERE id IN (?, ?)"
+        self.assertEqual(key_for(fetch_users, None, query, [1, 2]),
+                         key_for(fetch_users, None, query, (1, 2)))
+        self.assertEqual(key_for(fetch_users, None, query, {"b": 2, "a": 1}),
+                         key_for(fetch_users, None, query, {"a": 1, "b": 2}))
+        self.assertIsNotNone(key_for(fetch_users, None, query, {1, 2}))
+
+    def test_uncacheable_calls_have_no_key(self):
+        """Test that writes, unhashable and unsortable arguments give None."""
+        query = "SELECT * FROM users WHERE id = ?"
+        self.assertIsNone(key_for(fetch_users, None, "DELETE FROM users"))
+        self.assertIsNone(key_for(fetch_users, None, query, [bytearray(b"x")]))
+        self.assertIsNone(key_for(fetch_users, None, query, {1: "a", "b": 2}))
+        self.assertIsNone(key_for(fetch_users, None, query, (1,), "extra"))
+
+    def test_uncacheable_call_runs_uncached(self):
+        """Test that a call without a key still runs, every time."""
+        calls = []
+
+        @cache_query(cache=QueryCache())
+        def fetch(query, params):
+            calls.append(params)
+            return [params]
+        params = {1: "a", "b": 2}
+        self.assertEqual(fetch("SELECT * FROM users", params), [params])
+        self.assertEqual(fetch("SELECT * FROM users", params), [params])
+        self.assertEqual(len(calls), 2)
+
+
+class TestQueryCacheInvalidation(unittest.TestCase):
+    """Test class for QueryCache table invalidation."""
+
+    def setUp(self):
+        """Use a fresh cache for each test."""
+        self.cache = QueryCache()
+
+    def test_commit_evicts_only_readers_of_written_tables(self):
+        """Test that a commit drops the entries that read its tables."""
+        users = ("SELECT * FROM users", ())
+        orders = ("SELECT * FROM orders", ())
+        self.cache.set(users, [1], tables={"users"})
+        self.cache.set(orders, [2], tables={"orders"})
+
+        db_events.publish_commit({"orders"})
+
+        self.assertIn(users, self.cache)
+        self.assertNotIn(orders, self.cache)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_unparsed_query_is_evicted_by_any_commit(self):
+        """Test that entries depending on every table go on any commit."""
+        key = ("SELECT * FROM (VALUES (1))", ())
+        tables = db_events.tables_read(key[0])
+        self.assertEqual(tables, {db_events.ALL_TABLES})
+        self.cache.set(key, [1], tables=tables)
+
+        db_events.publish_commit({"anything"})
+
+        self.assertNotIn(key, self.cache)
+
+    def test_result_computed_across_a_commit_is_not_stored(self):
+        """Test that set() rejects a result older than an invalidation."""
+        key = ("SELECT * FROM users", ())
+        versions = self.cache.table_versions({"users"})
+        # A write to users commits while the query is running
+        self.cache.invalidate_tables({"users"})
+        self.cache.set(key, ["stale"], tables={"users"}, versions=versions)
+
+        self.assertNotIn(key, self.cache)
+        self.assertEqual(self.cache.stats()["rejected"], 1)
+
+    def test_commit_to_other_table_does_not_reject_result(self):
+        """Test that set() keeps a result when only other tables changed."""
+        key = ("SELECT * FROM users", ())
+        versions = self.cache.table_versions({"users"})
+        self.cache.invalidate_tables({"orders"})
+        self.cache.set(key, ["fresh"], tables={"users"}, versions=versions)
+
+        self.assertIn(key, self.cache)
+
+    def test_any_commit_rejects_result_of_unparsed_query(self):
+        """Test that a result depending on every table is not stored after
+        any commit."""
+        key = ("SELECT * FROM (VALUES (1))", ())
+        tables = {db_events.ALL_TABLES}
+        versions = self.cache.table_versions(tables)
+        self.cache.invalidate_tables({"orders"})
+        self.cache.set(key, [1], tables=tables, versions=versions)
+
+        self.assertNotIn(key, self.cache)
+
+
+class TestCacheQueryRace(unittest.TestCase):
+    """Test class for cache_query across concurrent commits."""
+
+    def setUp(self):
+        """Decorate a query function counting its executions."""
+        self.cache = QueryCache()
+        self.executions = 0
+        self.commit_during_query = False
+
+        @cache_query(cache=self.cache)
+        def fetch(query, age):
+            self.executions += 1
+            if self.commit_during_query:
+                self.commit_during_query = False
+                db_events.publish_commit({"users"})
+            return [("row", age, self.executions)]
+        self.fetch = fetch
+
+    def test_hit_after_miss(self):
+        """Test that a repeated call is served from the cache."""
+        first = self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        second = self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        self.assertEqual(first, second)
+        self.assertEqual(self.executions, 1)
+
+    def test_commit_during_query_is_not_cached(self):
+        """Test that a result read while users changed is run again."""
+        self.commit_during_query = True
+        self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        self.assertEqual(self.executions, 2)
+        self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        self.assertEqual(self.executions, 2)
+
+    def test_commit_after_query_evicts_result(self):
+        """Test that a commit to users makes the next call run again."""
+        self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        db_events.publish_commit({"users"})
+        self.fetch("SELECT * FROM users WHERE age > ?", 30)
+        self.assertEqual(self.executions, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Unit tests for the 5-circuit_breaker module."""
+
+import asyncio
+import importlib
+import sqlite3
+import unittest
+from unittest.mock import Mock, patch
+
+circuit_breaker_module = importlib.import_module("5-circuit_breaker")
+CircuitBreaker = circuit_breaker_module.CircuitBreaker
+CircuitOpenError = circuit_breaker_module.CircuitOpenError
+circuit_breaker = circuit_breaker_module.circuit_breaker
+
+
+def succeed():
+    """Call that works."""
+    return "ok"
+
+
+def fail():
+    """Call that hits a failing database."""
+    raise sqlite3.OperationalError("database is locked")
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test class for CircuitBreaker state transitions."""
+
+    def setUp(self):
+        """Run the breaker on a clock the test moves by hand."""
+        self.now = 1000.0
+        clock = Mock()
+        clock.monotonic.side_effect = lambda: self.now
+        patcher = patch.object(circuit_breaker_module, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("test", failure_rate=0.5, window=4,
+                                      min_calls=4, reset_timeout=10.0)
+
+    def call(self, func):
+        """Call func through the breaker, swallowing its database error."""
+        try:
+            return self.breaker.call(func)
+        except sqlite3.Error:
+            return None
+
+    def trip(self):
+        """Fail enough calls to open the circuit."""
+        for _ in range(4):
+            self.call(fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_stays_closed_below_min_calls(self):
+        """Test that failures before min_calls do not open the circuit."""
+        for _ in range(3):
+            self.call(fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_opens_at_failure_rate(self):
+        """Test that the circuit opens once the failure share is reached."""
+        self.call(succeed)
+        self.call(fail)
+        self.call(succeed)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.call(fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_circuit_rejects_without_calling(self):
+        """Test that calls fail fast while the circuit is open."""
+        self.trip()
+        func = Mock()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(func)
+        func.assert_not_called()
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_half_open_after_reset_timeout(self):
+        """Test that the circuit goes half-open once reset_timeout passes."""
+        self.trip()
+        self.now += 9.9
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 0.1
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_successful_trial_closes(self):
+        """Test that a successful half-open trial closes the circuit."""
+        self.trip()
+        self.now += 10
+        self.assertEqual(self.breaker.call(succeed), "ok")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats()["transitions"], {
+            "closed->open": 1, "open->half_open": 1, "half_open->closed": 1})
+
+    def test_failed_trial_reopens_and_restarts_timer(self):
+        """Test that a failed trial opens the circuit for another timeout."""
+        self.trip()
+        self.now += 10
+        self.call(fail)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 9.9
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.now += 0.1
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_half_open_admits_limited_trials(self):
+        """Test that only half_open_calls trials run at once."""
+        self.trip()
+        self.now += 10
+
+        def second_call_while_trial_runs():
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.call(succeed)
+            return "trial"
+        self.assertEqual(self.breaker.call(second_call_while_trial_runs),
+                         "trial")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_abandoned_trial_frees_its_slot(self):
+        """Test that a cancelled trial lets another trial through."""
+        self.trip()
+        self.now += 10
+
+        def cancelled():
+            raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            self.breaker.call(cancelled)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.call(succeed), "ok")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_outcome_from_previous_state_is_ignored(self):
+        """Test that a call admitted while closed cannot close a reopened
+        circuit's half-open window."""
+        for _ in range(3):
+            self.call(fail)
+
+        def slow_success():
+            # Another caller's failure trips the circuit meanwhile
+            self.call(fail)
+            self.now += 10
+            return "late"
+        self.assertEqual(self.breaker.call(slow_success), "late")
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_ignored_errors_do_not_count(self):
+        """Test that errors is_failure rejects leave the circuit closed."""
+        breaker = CircuitBreaker(
+            "caller-errors", window=4, min_calls=4,
+            is_failure=lambda e: not isinstance(e, sqlite3.ProgrammingError))
+
+        def bad_query():
+            raise sqlite3.ProgrammingError("bad query")
+        for _ in range(4):
+            with self.assertRaises(sqlite3.ProgrammingError):
+                breaker.call(bad_query)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()["failures"], 0)
+        self.assertEqual(breaker.stats()["successes"], 4)
+
+    def test_reset_closes(self):
+        """Test that reset() forces the circuit closed."""
+        self.trip()
+        self.breaker.reset()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.call(succeed), "ok")
+
+
+class TestCircuitBreakerDecorator(unittest.TestCase):
+    """Test class for the circuit_breaker decorator."""
+
+    def test_coroutine_shares_named_breaker(self):
+        """Test that functions with one name trip together, async too."""
+        name = f"{__name__}.{self.id()}"
+
+        @circuit_breaker(name, window=2, min_calls=2)
+        async def fetch():
+            raise sqlite3.OperationalError("database is locked")
+
+        @circuit_breaker(name)
+        def other():
+            return "ok"
+
+        self.assertIs(fetch.breaker, other.breaker)
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                asyncio.run(fetch())
+        with self.assertRaises(CircuitOpenError):
+            other()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Unit tests for the connection_pool module."""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from connection_pool import ConnectionPool, PoolTimeout, get_pool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test class for ConnectionPool."""
+
+    def setUp(self):
+        """Give each test its own database file."""
+        self.directory = tempfile.mkdtemp()
+        self.database = os.path.join(self.directory, "pool.db")
+
+    def tearDown(self):
+        """Remove the database file."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_pool(self, **kwargs):
+        """Return a pool on the test database, closed after the test."""
+        pool = ConnectionPool(self.database, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def in_thread(self, func):
+        """Run func in another thread and return its result."""
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.start()
+        thread.join(5)
+        return result[0]
+
+    def test_acquire_times_out_when_exhausted(self):
+        """Test that acquire raises PoolTimeout once max_size is in use."""
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire()
+        started = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        pool.release(conn)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_waiter_gets_released_connection(self):
+        """Test that a waiting acquire is handed the next released connection."""
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire()
+        timer = threading.Timer(0.1, pool.release, (conn,))
+        timer.start()
+        waited_for = pool.acquire(timeout=5)
+        timer.join()
+        self.assertIs(waited_for, conn)
+        pool.release(waited_for)
+        stats = pool.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_thread_gets_its_own_connection_back(self):
+        """Test that a thread gets back the connection it used last."""
+        pool = self.make_pool(max_size=2)
+        mine = pool.acquire()
+        other = self.in_thread(pool.acquire)
+        self.assertIsNot(mine, other)
+        # `other` is now the most recently used idle connection
+        pool.release(mine)
+        pool.release(other)
+
+        again = pool.acquire()
+        self.assertIs(again, mine)
+        pool.release(again)
+        self.assertEqual(pool.stats()["affinity_hits"], 1)
+
+    def test_unhealthy_idle_connection_is_replaced(self):
+        """Test that an idle connection failing its check is discarded."""
+        pool = self.make_pool(max_size=1, health_check_interval=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.close()
+
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(replacement.execute("SELECT 1").fetchone(), (1,))
+        pool.release(replacement)
+        self.assertEqual(pool.stats()["discarded_unhealthy"], 1)
+
+    def test_release_rolls_back_open_transaction(self):
+        """Test that uncommitted work is not handed to the next borrower."""
+        pool = self.make_pool(max_size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.commit()
+            conn.execute("INSERT INTO t VALUES (1)")
+        with pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone(),
+                             (0,))
+
+    def test_release_of_foreign_connection_raises(self):
+        """Test that release rejects a connection the pool did not lend."""
+        pool = self.make_pool()
+        other = self.make_pool().acquire()
+        with self.assertRaises(ValueError):
+            pool.release(other)
+
+    def test_memory_database_is_rejected(self):
+        """Test that ':memory:' cannot be pooled."""
+        for database in (":memory:", ""):
+            with self.assertRaises(ValueError):
+                ConnectionPool(database)
+            with self.assertRaises(ValueError):
+                get_pool(database)
+
+
+class TestGetPool(unittest.TestCase):
+    """Test class for get_pool."""
+
+    def test_same_file_shares_a_pool(self):
+        """Test that relative and absolute paths map to one pool."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        database = os.path.join(directory, "shared.db")
+        pool = get_pool(database, max_size=2)
+        self.addCleanup(pool.close)
+        relative = os.path.relpath(database)
+        self.assertIs(get_pool(relative), pool)
+        self.assertEqual(pool.max_size, 2)
+
+    def test_different_options_for_existing_pool_warn(self):
+        """Test that options an existing pool ignores are flagged."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        database = os.path.join(directory, "options.db")
+        pool = get_pool(database, max_size=2, timeout=1.0)
+        self.addCleanup(pool.close)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            self.assertIs(get_pool(database, max_size=2, timeout=1.0), pool)
+        with self.assertWarnsRegex(RuntimeWarning, "factory, max_size"):
+            get_pool(database, max_size=3, factory=sqlite3.Connection)
+
+
+if __name__ == "__main__":
+    unittest.main()
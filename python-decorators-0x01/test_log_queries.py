@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Unit tests for the 0-log_queries module."""
+
+import importlib
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+log_queries_module = None
+_cwd = None
+_directory = None
+
+
+def setUpModule():
+    """Import 0-log_queries from a scratch directory.
+
+    The module queries users.db when imported, which also starts logging
+    to stdout; it gets a throwaway users.db.
+    """
+    global log_queries_module, _cwd, _directory
+    _cwd = os.getcwd()
+    _directory = tempfile.mkdtemp()
+    os.chdir(_directory)
+    conn = sqlite3.connect("users.db")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    conn.close()
+    with redirect_stdout(io.StringIO()):
+        log_queries_module = importlib.import_module("0-log_queries")
+        log_queries_module.stop_query_logging()
+
+
+def tearDownModule():
+    """Leave the scratch directory."""
+    log_queries_module.stop_query_logging()
+    os.chdir(_cwd)
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+class TestQueryLogging(unittest.TestCase):
+    """Test class for log_queries and start_query_logging."""
+
+    def setUp(self):
+        """Start from the import-time state: logging to stdout."""
+        self.stdout = io.StringIO()
+        self.enterContext(redirect_stdout(self.stdout))
+        log_queries_module.stop_query_logging()
+        log_queries_module.start_query_logging()
+        self.addCleanup(log_queries_module.stop_query_logging)
+        self.addCleanup(log_queries_module.logger.setLevel, logging.INFO)
+
+        @log_queries_module.log_queries
+        def run(query):
+            return [query]
+        self.run_query = run
+
+    def capture(self):
+        """Add a handler collecting formatted records; return its stream."""
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(log_queries_module.QueryFormatter())
+        log_queries_module.start_query_logging(handler)
+        return stream
+
+    def test_handlers_replace_default_output(self):
+        """Test that handlers passed later get the records, not stdout."""
+        stream = self.capture()
+        self.run_query("SELECT 1")
+        log_queries_module.stop_query_logging()
+        self.assertIn("SELECT 1", stream.getvalue())
+        self.assertNotIn("SELECT 1", self.stdout.getvalue())
+
+    def test_later_handlers_are_added(self):
+        """Test that a second set of handlers joins the first."""
+        first = self.capture()
+        second = self.capture()
+        self.run_query("SELECT 2")
+        log_queries_module.stop_query_logging()
+        self.assertIn("SELECT 2", first.getvalue())
+        self.assertIn("SELECT 2", second.getvalue())
+
+    def test_records_before_switch_go_to_old_handlers(self):
+        """Test that queued records are not lost when handlers change."""
+        self.run_query("SELECT 3")
+        stream = self.capture()
+        log_queries_module.stop_query_logging()
+        self.assertIn("SELECT 3", self.stdout.getvalue())
+        self.assertNotIn("SELECT 3", stream.getvalue())
+
+    def test_raising_level_stops_records(self):
+        """Test that the level is checked at call time, not only at
+        decoration."""
+        stream = self.capture()
+        log_queries_module.logger.setLevel(logging.WARNING)
+        self.run_query("SELECT 4")
+        log_queries_module.logger.setLevel(logging.INFO)
+        self.run_query("SELECT 5")
+        log_queries_module.stop_query_logging()
+        self.assertNotIn("SELECT 4", stream.getvalue())
+        self.assertIn("SELECT 5", stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Unit tests for the 7-n_plus_one module."""
+
+import importlib
+import os
+import shutil
+import tempfile
+import unittest
+from connection_pool import ConnectionPool
+
+n_plus_one = importlib.import_module("7-n_plus_one")
+
+
+class TestRequestScope(unittest.TestCase):
+    """Test class for request_scope and track_queries."""
+
+    def setUp(self):
+        """Give each test a pooled (traced) connection to a users table."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.pool = ConnectionPool(os.path.join(directory, "users.db"))
+        self.addCleanup(self.pool.close)
+        self.conn = self.pool.acquire()
+        self.addCleanup(self.pool.release, self.conn)
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                          "name TEXT)")
+        self.conn.executemany("INSERT INTO users (name) VALUES (?)",
+                              [(f"user{i}",) for i in range(20)])
+        self.conn.commit()
+
+    def test_repeated_select_is_reported(self):
+        """Test that a SELECT run in a loop is found, with its batch form."""
+        @n_plus_one.track_queries
+        def get_user(conn, user_id):
+            return conn.execute("SELECT * FROM users WHERE id = ?",
+                                (user_id,)).fetchone()
+
+        with self.assertLogs("queries.n_plus_one", "WARNING"):
+            with n_plus_one.request_scope("page", threshold=5) as scope:
+                for user_id in range(1, 11):
+                    get_user(self.conn, user_id)
+
+        [finding] = scope.findings
+        self.assertEqual(finding["fingerprint"],
+                         "select * from users where id = ?")
+        self.assertEqual(finding["count"], 10)
+        self.assertEqual(finding["example"],
+                         "SELECT * FROM users WHERE id = 1")
+        self.assertEqual(finding["callers"], [get_user.__module__ + "."
+                                              + get_user.__qualname__])
+        self.assertEqual(finding["suggestion"],
+                         "select * from users where id in (?+)")
+
+    def test_scope_keeps_counts_not_statements(self):
+        """Test that memory grows with query shapes, not statements."""
+        with n_plus_one.request_scope("job", threshold=10 ** 9) as scope:
+            for user_id in range(2000):
+                self.conn.execute("SELECT name FROM users WHERE id = ?",
+                                  (user_id,)).fetchone()
+        self.assertEqual(dict(scope.counts),
+                         {"select name from users where id = ?": 2000})
+        self.assertEqual(len(scope.examples), 1)
+        self.assertEqual(scope.findings, [])
+
+    def test_writes_are_not_counted(self):
+        """Test that executemany rows and other writes are ignored."""
+        with n_plus_one.request_scope("bulk", threshold=2) as scope:
+            self.conn.executemany("UPDATE users SET name = ? WHERE id = ?",
+                                  [(f"new{i}", i) for i in range(20)])
+            self.conn.commit()
+        self.assertEqual(scope.counts, {})
+        self.assertEqual(scope.findings, [])
+
+    def test_nested_scope_joins_outer(self):
+        """Test that a scope opened inside another counts into it."""
+        with n_plus_one.request_scope("outer", threshold=10 ** 9) as outer:
+            with n_plus_one.request_scope("inner") as inner:
+                self.conn.execute("SELECT 1").fetchone()
+            self.conn.execute("SELECT 1").fetchone()
+        self.assertIs(inner, outer)
+        self.assertEqual(outer.counts["select ?"], 2)
+
+
+class TestBatchSuggestion(unittest.TestCase):
+    """Test class for batch_suggestion."""
+
+    def test_where_key_becomes_in_list(self):
+        """Test that the first key predicate after WHERE is batched."""
+        self.assertEqual(
+            n_plus_one.batch_suggestion(
+                "select * from orders where user_id = ? and status = ?"),
+            "select * from orders where user_id in (?+) and status = ?")
+
+    def test_non_select_has_no_suggestion(self):
+        """Test that writes and key-less queries get no suggestion."""
+        self.assertIsNone(n_plus_one.batch_suggestion(
+            "update users set name = ? where id = ?"))
+        self.assertIsNone(n_plus_one.batch_suggestion("select * from users"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Unit tests for the 6-query_metrics module."""
+
+import importlib
+import os
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from connection_pool import get_pool
+
+query_metrics = importlib.import_module("6-query_metrics")
+
+
+class TestSlowQueryLog(unittest.TestCase):
+    """Test class for the slow-query log."""
+
+    def setUp(self):
+        """Give each test a pooled database with one user."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.database = os.path.join(directory, "users.db")
+        self.pool = get_pool(self.database)
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                         "email TEXT)")
+            conn.execute("INSERT INTO users (email) "
+                         "VALUES ('alice@example.com')")
+            conn.commit()
+        self.metrics = query_metrics.QueryMetrics()
+
+    def find_user(self, **options):
+        """Return a timed lookup by email that is always slow."""
+        @query_metrics.timed_query(metrics=self.metrics, slow_ms=0,
+                                   database=self.database, **options)
+        def find_user(email):
+            with self.pool.connection() as conn:
+                return conn.execute("SELECT id FROM users WHERE email = ?",
+                                    (email,)).fetchall()
+        return find_user
+
+    def wait_for(self, logs, count):
+        """Wait for the reporter thread to log `count` records."""
+        deadline = time.monotonic() + 5
+        while len(logs.records) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_slow_log_has_fingerprint_not_values(self):
+        """Test that parameter values never reach the slow-query log."""
+        with self.assertLogs("queries.slow", "WARNING") as logs:
+            self.assertEqual(self.find_user()("alice@example.com"), [(1,)])
+            self.wait_for(logs, 1)
+        message = logs.records[0].getMessage()
+        self.assertIn("select id from users where email = ?", message)
+        self.assertNotIn("alice@example.com", message)
+        self.assertIn("users", message.split("\n", 2)[2])
+
+    def test_metrics_are_grouped_by_fingerprint(self):
+        """Test that calls with different values share one series."""
+        find_user = self.find_user(explain_slow=False)
+        with self.assertLogs("queries.slow", "WARNING") as logs:
+            find_user("alice@example.com")
+            find_user("bob@example.com")
+            self.wait_for(logs, 2)
+        [series] = self.metrics.snapshot().values()
+        stats = series["select id from users where email = ?"]
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["rows"], 1)
+        self.assertEqual(stats["slow"], 2)
+
+    def test_full_queue_drops_and_counts(self):
+        """Test that slow calls beyond the queue's size are dropped."""
+        before = query_metrics.slow_log_stats()["dropped"]
+        with patch.object(query_metrics, "_slow_calls", queue.Queue(1)), \
+                patch.object(query_metrics, "_reporter", object()):
+            find_user = self.find_user()
+            for _ in range(3):
+                find_user("alice@example.com")
+            stats = query_metrics.slow_log_stats()
+        self.assertEqual(stats["queued"], 1)
+        self.assertEqual(stats["dropped"] - before, 2)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Test class for LatencyHistogram."""
+
+    def test_percentiles_within_bucket_precision(self):
+        """Test that percentiles are within about 1.6% of the true value."""
+        histogram = query_metrics.LatencyHistogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+        for p, expected in ((50, 50000), (99, 99000), (99.9, 99900)):
+            self.assertAlmostEqual(histogram.percentile(p), expected,
+                                   delta=expected * 0.016)
+        self.assertEqual(histogram.percentile(100), 100000)
+        self.assertEqual(histogram.min, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Unit tests for the 3-retry_on_failure module."""
+
+import asyncio
+import importlib
+import sqlite3
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import Mock, patch
+from connection_pool import PoolTimeout
+
+retry_module = importlib.import_module("3-retry_on_failure")
+RetryBudget = retry_module.RetryBudget
+is_transient = retry_module.is_transient
+retry_on_failure = retry_module.retry_on_failure
+
+LOCKED = sqlite3.OperationalError("database is locked")
+
+
+class ClockTestCase(unittest.TestCase):
+    """Base class that runs the module on a clock the test controls;
+    time.sleep advances it instead of blocking."""
+
+    def setUp(self):
+        """Patch the module's clock and silence its progress output."""
+        self.now = 1000.0
+        self.sleeps = []
+        clock = Mock()
+        clock.monotonic.side_effect = lambda: self.now
+        clock.sleep.side_effect = self.sleep
+        patcher = patch.object(retry_module, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.enterContext(redirect_stdout(StringIO()))
+
+    def sleep(self, seconds):
+        """Record a backoff pause and move the clock past it."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def failing(self, error=LOCKED):
+        """Return a mock that always raises `error`."""
+        return Mock(side_effect=error, __name__="query",
+                    __qualname__="query")
+
+
+class TestRetryBudget(ClockTestCase):
+    """Test class for RetryBudget."""
+
+    def test_withdraw_until_empty(self):
+        """Test that each retry spends a token until none are left."""
+        budget = RetryBudget(capacity=3, rate=1.0, ratio=0.1)
+        self.assertEqual([budget.withdraw() for _ in range(4)],
+                         [True, True, True, False])
+        stats = budget.stats()
+        self.assertEqual((stats["withdrawals"], stats["exhausted"]), (3, 1))
+
+    def test_tokens_refill_with_time(self):
+        """Test that tokens come back at `rate` per second."""
+        budget = RetryBudget(capacity=3, rate=0.5)
+        while budget.withdraw():
+            pass
+        self.now += 1.9
+        self.assertFalse(budget.withdraw())
+        self.now += 0.1
+        self.assertTrue(budget.withdraw())
+
+    def test_first_attempts_earn_a_fraction_of_a_token(self):
+        """Test that every deposit adds `ratio` tokens, up to capacity."""
+        budget = RetryBudget(capacity=3, rate=0, ratio=0.25)
+        while budget.withdraw():
+            pass
+        for _ in range(4):
+            budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        for _ in range(100):
+            budget.deposit()
+        self.assertEqual(budget.stats()["tokens"], 3)
+
+
+class TestRetryOnFailure(ClockTestCase):
+    """Test class for the retry_on_failure decorator."""
+
+    def setUp(self):
+        """Give each test a full budget that does not refill."""
+        super().setUp()
+        self.budget = RetryBudget(capacity=100, rate=0, ratio=0)
+
+    def test_gives_up_after_retries_attempts(self):
+        """Test that a transient error is tried `retries` times in all."""
+        query = self.failing()
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_failure(retries=3, budget=self.budget)(query)()
+        self.assertEqual(query.call_count, 3)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_permanent_error_is_not_retried(self):
+        """Test that errors is_transient rejects are raised at once."""
+        query = self.failing(sqlite3.OperationalError("no such table: x"))
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_failure(budget=self.budget)(query)()
+        self.assertEqual(query.call_count, 1)
+
+    def test_returns_once_an_attempt_succeeds(self):
+        """Test that the first successful attempt's result is returned."""
+        query = Mock(side_effect=[LOCKED, LOCKED, "rows"])
+        self.assertEqual(
+            retry_on_failure(retries=5, budget=self.budget)(query)(), "rows")
+        self.assertEqual(query.call_count, 3)
+
+    def test_jittered_backoff_bounds(self):
+        """Test that pause n is drawn from [0, min(max_delay,
+        delay * backoff ** n)]."""
+        uniform = Mock(side_effect=lambda low, high: high)
+        with patch.object(retry_module.random, "uniform", uniform):
+            with self.assertRaises(sqlite3.OperationalError):
+                retry_on_failure(retries=6, delay=1, backoff=3, max_delay=20,
+                                 budget=self.budget)(self.failing())()
+        self.assertEqual([call.args for call in uniform.call_args_list],
+                         [(0, 1), (0, 3), (0, 9), (0, 20), (0, 20)])
+        self.assertEqual(self.sleeps, [1, 3, 9, 20, 20])
+
+    def test_pauses_stay_within_bounds(self):
+        """Test that the real random pauses never exceed their bound."""
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_failure(retries=8, delay=0.5, max_delay=10,
+                             budget=self.budget)(self.failing())()
+        bounds = [min(10, 0.5 * 2 ** n) for n in range(7)]
+        for pause, bound in zip(self.sleeps, bounds):
+            self.assertTrue(0 <= pause <= bound, (pause, bound))
+
+    def test_deadline_stops_retries(self):
+        """Test that no retry starts if its pause would pass the deadline."""
+        query = self.failing()
+        with patch.object(retry_module.random, "uniform",
+                          lambda low, high: high):
+            with self.assertRaises(sqlite3.OperationalError):
+                retry_on_failure(retries=10, delay=2, deadline=5,
+                                 budget=self.budget)(query)()
+        # Waits 2s, then a 4s pause would end 6s after the start
+        self.assertEqual(self.sleeps, [2])
+        self.assertEqual(query.call_count, 2)
+
+    def test_empty_budget_stops_retries(self):
+        """Test that a call fails after one attempt when the budget is out."""
+        budget = RetryBudget(capacity=1, rate=0, ratio=0)
+        query = self.failing()
+        with self.assertRaises(sqlite3.OperationalError):
+            retry_on_failure(retries=5, budget=budget)(query)()
+        self.assertEqual(query.call_count, 2)
+
+    def test_default_budget_limits_a_burst(self):
+        """Test that the process-wide budget (capacity 20) stops retrying
+        once a burst of failing calls has spent it."""
+        with patch.object(retry_module, "retry_budget", RetryBudget()):
+            query = self.failing()
+            locked_query = retry_on_failure(retries=3, delay=0)(query)
+            attempts = []
+            for _ in range(30):
+                before = query.call_count
+                with self.assertRaises(sqlite3.OperationalError):
+                    locked_query()
+                attempts.append(query.call_count - before)
+            stats = retry_module.retry_budget.stats()
+        self.assertEqual(retry_module.RetryBudget().capacity, 20)
+        # The first 10 calls spend the 20 tokens; after that each call
+        # earns 0.1 of a token, so only one call in ten gets a retry
+        self.assertEqual(attempts[:10], [3] * 10)
+        self.assertLessEqual(sum(attempts[10:]) - 20, 2)
+        self.assertLessEqual(stats["withdrawals"], 20 + 30 * 0.1)
+
+    def test_coroutine_function_is_retried(self):
+        """Test that coroutine functions are retried with asyncio.sleep."""
+        attempts = []
+
+        @retry_on_failure(retries=3, delay=0, budget=self.budget)
+        async def query():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise LOCKED
+            return "rows"
+
+        self.assertEqual(asyncio.run(query()), "rows")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.sleeps, [])
+
+
+class TestIsTransient(unittest.TestCase):
+    """Test class for is_transient."""
+
+    def test_lock_and_busy_errors_are_transient(self):
+        """Test that contention and timeouts are worth retrying."""
+        for error in (LOCKED,
+                      sqlite3.OperationalError("database table is locked"),
+                      sqlite3.OperationalError("Database is busy"),
+                      PoolTimeout("no connection"), TimeoutError(),
+                      ConnectionResetError()):
+            with self.subTest(error=error):
+                self.assertTrue(is_transient(error))
+
+    def test_statement_errors_are_not_transient(self):
+        """Test that errors in the statement itself are not retried."""
+        for error in (sqlite3.OperationalError("no such table: users"),
+                      sqlite3.IntegrityError("UNIQUE constraint failed"),
+                      ValueError("bad value")):
+            with self.subTest(error=error):
+                self.assertFalse(is_transient(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Unit tests for the shared_cache module."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+import db_events
+import shared_cache
+from shared_cache import SQLiteCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class SharedCacheTestCase(unittest.TestCase):
+    """Base class giving each test a fresh cache file."""
+
+    def setUp(self):
+        """Create a scratch directory for the cache file."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, "cache.db")
+
+    def cache(self, **options):
+        """Open a SQLiteCache on this test's file, as a process would."""
+        return SQLiteCache(self.path, **options)
+
+
+class ClockTestCase(SharedCacheTestCase):
+    """Base class that runs the cache on a clock the test controls;
+    time.sleep advances it instead of blocking."""
+
+    def setUp(self):
+        """Patch the module's clock."""
+        super().setUp()
+        self.now = 1000.0
+        clock = Mock()
+        clock.time.side_effect = lambda: self.now
+        clock.sleep.side_effect = self.sleep
+        patcher = patch.object(shared_cache, "time", clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        """Move the clock forward."""
+        self.now += seconds
+
+
+class TestExpiry(ClockTestCase):
+    """Test class for TTL expiry and eviction."""
+
+    def test_entry_expires_after_ttl(self):
+        """Test that an entry is a hit until its TTL has passed."""
+        cache = self.cache(ttl=10)
+        cache.set("key", [(1, "a")])
+        self.now += 9.9
+        self.assertEqual(cache.get("key"), (True, [(1, "a")]))
+        self.now += 0.1
+        self.assertEqual(cache.get("key"), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats["expirations"], stats["entries"]), (1, 0))
+
+    def test_zero_ttl_never_expires(self):
+        """Test that ttl=0 stores an entry without an expiry time."""
+        cache = self.cache()
+        cache.set("key", "rows", ttl=0)
+        self.now += 10 ** 9
+        self.assertEqual(cache.get("key"), (True, "rows"))
+
+    def test_oldest_entries_are_evicted(self):
+        """Test that going past max_entries trims the oldest entries."""
+        cache = self.cache(max_entries=10)
+        for i in range(11):
+            cache.set(i, i)
+        self.assertEqual(cache.get(0), (False, None))
+        self.assertEqual(cache.get(10), (True, 10))
+        self.assertEqual(cache.stats()["entries"], 9)
+
+
+class TestLeases(ClockTestCase):
+    """Test class for the cross-process flight() lease."""
+
+    def test_free_lease_is_taken_at_once(self):
+        """Test that flight() does not wait when no lease is held."""
+        cache = self.cache()
+        with cache.flight("key"):
+            pass
+        with cache.flight("key"):
+            pass
+        self.assertEqual(self.now, 1000.0)
+        self.assertEqual(cache.stats()["lease_waits"], 0)
+
+    def test_expired_lease_is_taken_over(self):
+        """Test that a lease left by a dead holder expires."""
+        holder = self.cache(lease_timeout=5, poll_interval=1)
+        lease = holder.flight("key")
+        lease.__enter__()  # the holder dies without releasing it
+        waiter = self.cache(lease_timeout=5, poll_interval=1)
+        with waiter.flight("key"):
+            self.assertEqual(self.now, 1005.0)
+        self.assertEqual(waiter.stats()["lease_waits"], 1)
+
+    def test_leases_are_per_key(self):
+        """Test that a lease on one key does not block another key."""
+        cache = self.cache()
+        with cache.flight("a"), cache.flight("b"):
+            pass
+        self.assertEqual(cache.stats()["lease_waits"], 0)
+
+
+class TestLeaseWait(SharedCacheTestCase):
+    """Test class for waiting on a lease held by another cache."""
+
+    def test_waiter_runs_after_holder_releases(self):
+        """Test that a second cache on the file waits for the holder."""
+        holder = self.cache()
+        waiter = self.cache(poll_interval=0.001)
+        events = []
+
+        def wait_for_lease():
+            with waiter.flight("key"):
+                events.append("waiter")
+
+        with holder.flight("key"):
+            thread = threading.Thread(target=wait_for_lease)
+            thread.start()
+            thread.join(0.2)  # long enough for it to find the lease
+            events.append("holder")
+        thread.join(5)
+        self.assertEqual(events, ["holder", "waiter"])
+        self.assertEqual(waiter.stats()["lease_waits"], 1)
+
+
+class TestTableVersions(SharedCacheTestCase):
+    """Test class for invalidation and table version checks."""
+
+    def test_commit_during_query_rejects_result(self):
+        """Test that a result is not stored if its table changed meanwhile."""
+        cache = self.cache()
+        versions = cache.table_versions({"users"})
+        self.cache().invalidate_tables({"users"})
+        cache.set("key", "stale", tables={"users"}, versions=versions)
+        self.assertEqual(cache.get("key"), (False, None))
+        self.assertEqual(cache.stats()["rejected"], 1)
+
+    def test_commit_to_other_table_does_not_reject(self):
+        """Test that only the query's own tables are compared."""
+        cache = self.cache()
+        versions = cache.table_versions({"users"})
+        cache.invalidate_tables({"orders"})
+        cache.set("key", "rows", tables={"users"}, versions=versions)
+        self.assertEqual(cache.get("key"), (True, "rows"))
+
+    def test_invalidation_is_seen_by_every_cache(self):
+        """Test that one process's invalidation drops entries for all."""
+        cache, other = self.cache(), self.cache()
+        cache.set("users", "u", tables={"users"})
+        cache.set("orders", "o", tables={"orders"})
+        cache.set("unknown", "x", tables={db_events.ALL_TABLES})
+        other.invalidate_tables({"users"})
+        self.assertEqual(cache.get("users"), (False, None))
+        self.assertEqual(cache.get("unknown"), (False, None))
+        self.assertEqual(cache.get("orders"), (True, "o"))
+
+
+class TestCanonicalKeys(unittest.TestCase):
+    """Test class for process-independent key digests."""
+
+    KEY = ("SELECT * FROM users WHERE name IN ?",
+           frozenset({"alice", "bob", "carol", "dave"}),
+           {"b": 2, "a": 1})
+
+    def test_equal_keys_share_a_digest(self):
+        """Test that sets and dicts digest the same in any order."""
+        reordered = (self.KEY[0], frozenset({"dave", "carol", "bob", "alice"}),
+                     {"a": 1, "b": 2})
+        self.assertEqual(SQLiteCache._digest(self.KEY),
+                         SQLiteCache._digest(reordered))
+        self.assertNotEqual(SQLiteCache._digest(self.KEY),
+                            SQLiteCache._digest(self.KEY[:2]))
+
+    def test_digest_is_the_same_in_other_processes(self):
+        """Test that string hash randomisation does not change digests."""
+        script = ("import shared_cache, sys; "
+                  f"sys.stdout.write(shared_cache.SQLiteCache._digest("
+                  f"{self.KEY!r}).hex())")
+        digests = set()
+        for seed in ("1", "2", "3"):
+            result = subprocess.run(
+                [sys.executable, "-c", script], cwd=HERE, check=True,
+                capture_output=True, text=True,
+                env=dict(os.environ, PYTHONHASHSEED=seed))
+            digests.add(result.stdout)
+        self.assertEqual(digests, {SQLiteCache._digest(self.KEY).hex()})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Unit tests for the singleflight module."""
+
+import asyncio
+import threading
+import time
+import unittest
+from singleflight import SingleFlight, coalesce
+
+
+def wait_until(condition):
+    """Wait up to 5 seconds for condition() to become true."""
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+class TestSingleFlightThreads(unittest.TestCase):
+    """Test class for SingleFlight.do."""
+
+    def setUp(self):
+        """Give each test its own flight group and a gate for the leader."""
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, outcome):
+        """Return a function that waits for the gate, then returns or
+        raises `outcome`."""
+        def fn():
+            self.calls += 1
+            self.release.wait(5)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        return fn
+
+    def run_callers(self, fn, count=5):
+        """Call do("key", fn) from `count` threads; return their outcomes."""
+        outcomes = [None] * count
+
+        def caller(index):
+            try:
+                outcomes[index] = self.flight.do("key", fn)
+            except BaseException as e:
+                outcomes[index] = e
+
+        threads = [threading.Thread(target=caller, args=(i,))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(wait_until(
+            lambda: self.flight.stats()["coalesced"] == count - 1))
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test that callers waiting on a running key get its result."""
+        result = object()
+        outcomes = self.run_callers(self.slow(result))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(outcome is result for outcome in outcomes))
+        self.assertEqual(self.flight.stats(),
+                         {"executions": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_exception_is_shared(self):
+        """Test that every waiting caller gets the leader's exception."""
+        error = ValueError("boom")
+        outcomes = self.run_callers(self.slow(error))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+
+    def test_finished_call_is_not_reused(self):
+        """Test that a call made after the first one finished runs again."""
+        self.release.set()
+        self.assertEqual(self.flight.do("key", self.slow(1)), 1)
+        self.assertEqual(self.flight.do("key", self.slow(2)), 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_different_keys_run_separately(self):
+        """Test that only calls for the same key are coalesced."""
+        self.release.set()
+        self.flight.do("a", self.slow(1))
+        self.flight.do("b", self.slow(2))
+        self.assertEqual(self.flight.stats()["coalesced"], 0)
+
+
+class TestSingleFlightAsync(unittest.IsolatedAsyncioTestCase):
+    """Test class for SingleFlight.do_async."""
+
+    async def asyncSetUp(self):
+        """Give each test its own flight group and a gate for the work."""
+        self.flight = SingleFlight()
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    def slow(self, outcome):
+        """Return a coroutine function that waits for the gate, then
+        returns or raises `outcome`."""
+        async def coro_fn():
+            self.calls += 1
+            await self.release.wait()
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        return coro_fn
+
+    async def start_callers(self, coro_fn, count=5):
+        """Start `count` tasks awaiting do_async("key", coro_fn)."""
+        tasks = [asyncio.create_task(self.flight.do_async("key", coro_fn))
+                 for _ in range(count)]
+        await asyncio.sleep(0)
+        return tasks
+
+    async def test_concurrent_awaits_share_one_execution(self):
+        """Test that concurrent awaits of a key share one coroutine."""
+        tasks = await self.start_callers(self.slow("rows"))
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["rows"] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats(),
+                         {"executions": 1, "coalesced": 4, "in_flight": 0})
+
+    async def test_exception_is_shared(self):
+        """Test that every awaiting caller gets the shared exception."""
+        error = ValueError("boom")
+        tasks = await self.start_callers(self.slow(error))
+        self.release.set()
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+        self.assertEqual(self.calls, 1)
+
+    async def test_cancelled_caller_does_not_cancel_the_rest(self):
+        """Test that cancelling the caller that started the work leaves it
+        running for the other callers."""
+        leader, *others = await self.start_callers(self.slow("rows"), 3)
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*others), ["rows", "rows"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+
+class TestCoalesce(unittest.TestCase):
+    """Test class for the coalesce decorator."""
+
+    def test_unhashable_arguments_run_directly(self):
+        """Test that calls with unhashable arguments bypass the group."""
+        flight = SingleFlight()
+
+        @coalesce(flight=flight)
+        def total(values):
+            return sum(values)
+
+        self.assertEqual(total([1, 2, 3]), 6)
+        self.assertEqual(total((1, 2, 3)), 6)
+        self.assertEqual(flight.stats()["executions"], 1)
+
+    def test_coroutine_function(self):
+        """Test that coroutine functions are coalesced with do_async."""
+        flight = SingleFlight()
+        calls = []
+
+        @coalesce(flight=flight)
+        async def fetch(user_id):
+            calls.append(user_id)
+            await asyncio.sleep(0.01)
+            return {"id": user_id}
+
+        async def main():
+            return await asyncio.gather(fetch(1), fetch(1), fetch(2))
+
+        self.assertEqual(asyncio.run(main()),
+                         [{"id": 1}, {"id": 1}, {"id": 2}])
+        self.assertEqual(calls, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
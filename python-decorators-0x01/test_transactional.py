@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Unit tests for group commit in the 2-transactional module."""
+
+import importlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from connection_pool import PoolTimeout, get_pool
+import db_events
+
+transactional = None
+_cwd = None
+_directory = None
+
+
+def setUpModule():
+    """Import 2-transactional from a scratch directory.
+
+    The module updates a row of users.db when imported, so it gets a
+    throwaway users.db instead of the real one.
+    """
+    global transactional, _cwd, _directory
+    _cwd = os.getcwd()
+    _directory = tempfile.mkdtemp()
+    os.chdir(_directory)
+    conn = sqlite3.connect("users.db")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+                  "email TEXT, age INTEGER)")
+    conn.execute("INSERT INTO users (name, email, age) "
+                 "VALUES ('a', 'a@example.com', 30)")
+    conn.commit()
+    conn.close()
+    with redirect_stdout(StringIO()):
+        transactional = importlib.import_module("2-transactional")
+
+
+def tearDownModule():
+    """Leave the scratch directory."""
+    os.chdir(_cwd)
+    shutil.rmtree(_directory, ignore_errors=True)
+
+
+def insert_item(conn, name):
+    """Group call that inserts one item."""
+    conn.execute("INSERT INTO items (name) VALUES (?)", (name,))
+    return name
+
+
+def insert_item_then_fail(conn, name):
+    """Group call that inserts one item and then raises."""
+    conn.execute("INSERT INTO items (name) VALUES (?)", (name,))
+    raise ValueError(name)
+
+
+class _Recorder:
+    """Commit listener that notes the tables of each commit."""
+
+    def __init__(self):
+        self.published = []
+
+    def invalidate_tables(self, tables):
+        """Record one notification."""
+        self.published.append(tables)
+
+
+class _BrokenCache(_Recorder):
+    """Commit listener that fails, like a cache whose store is locked."""
+
+    def invalidate_tables(self, tables):
+        """Record and fail every notification."""
+        super().invalidate_tables(tables)
+        raise sqlite3.OperationalError("database is locked")
+
+
+class TestCommitNotification(unittest.TestCase):
+    """Test class for commit listeners that fail."""
+
+    def setUp(self):
+        """Register a failing listener and, after it, a working one."""
+        self.broken = _BrokenCache()
+        db_events.on_commit(self.broken.invalidate_tables)
+        self.recorder = _Recorder()
+        db_events.on_commit(self.recorder.invalidate_tables)
+        self.enterContext(redirect_stdout(StringIO()))
+        self.enterContext(self.assertLogs("queries.events", "ERROR"))
+        self.database = os.path.join(_directory, f"{self.id()}.db")
+        self.conn = sqlite3.connect(self.database)
+        self.conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, "
+                          "name TEXT)")
+        self.conn.commit()
+        db_events.trace(self.conn)
+        self.addCleanup(self.conn.close)
+
+    def tearDown(self):
+        """Drop the listeners; db_events only holds them weakly."""
+        self.broken = self.recorder = None
+
+    def test_committed_write_does_not_raise(self):
+        """Test that @transactional returns once committed, whatever a
+        listener does."""
+        @transactional.transactional
+        def add(conn, name):
+            conn.execute("INSERT INTO items (name) VALUES (?)", (name,))
+            return name
+
+        self.assertEqual(add(self.conn, "a"), "a")
+        self.assertEqual(len(self.broken.published), 1)
+        self.assertIn(frozenset({"items"}), self.recorder.published)
+        count = self.conn.execute("SELECT COUNT(*) FROM items").fetchone()
+        self.assertEqual(count, (1,))
+
+    def test_group_results_survive_failing_listener(self):
+        """Test that group calls get their results despite the listener."""
+        committer = transactional.GroupCommitter(self.database)
+        self.addCleanup(committer.close)
+        self.assertEqual(committer.call(insert_item, "b"), "b")
+        self.assertEqual(committer.stats()["failed_groups"], 0)
+
+
+class TestGroupCommitter(unittest.TestCase):
+    """Test class for GroupCommitter."""
+
+    def setUp(self):
+        """Create a fresh items table and committer for each test."""
+        self.database = os.path.join(_directory, f"{self.id()}.db")
+        conn = sqlite3.connect(self.database)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.commit()
+        conn.close()
+        self.committer = transactional.GroupCommitter(
+            self.database, max_batch=3, max_delay=1.0)
+        self.output = self.enterContext(redirect_stdout(StringIO()))
+
+    def tearDown(self):
+        """Stop the committer's thread."""
+        self.committer.close()
+
+    def names(self):
+        """Return the committed item names."""
+        conn = sqlite3.connect(self.database)
+        try:
+            return sorted(row[0] for row in
+                          conn.execute("SELECT name FROM items"))
+        finally:
+            conn.close()
+
+    def test_calls_share_one_transaction(self):
+        """Test that queued calls commit together as one group."""
+        futures = [self.committer.submit(insert_item, name)
+                   for name in ("a", "b", "c")]
+        self.assertEqual([f.result(5) for f in futures], ["a", "b", "c"])
+        self.assertEqual(self.names(), ["a", "b", "c"])
+        stats = self.committer.stats()
+        self.assertEqual(stats["groups"], 1)
+        self.assertEqual(stats["calls"], 3)
+
+    def test_failed_call_rolls_back_to_its_savepoint(self):
+        """Test that a failing call is undone while the rest commit."""
+        ok = self.committer.submit(insert_item, "a")
+        bad = self.committer.submit(insert_item_then_fail, "b")
+        also_ok = self.committer.submit(insert_item, "c")
+
+        self.assertEqual(ok.result(5), "a")
+        self.assertEqual(also_ok.result(5), "c")
+        with self.assertRaises(ValueError):
+            bad.result(5)
+        self.assertEqual(self.names(), ["a", "c"])
+        stats = self.committer.stats()
+        self.assertEqual(stats["groups"], 1)
+        self.assertEqual(stats["failed_calls"], 1)
+        self.assertEqual(stats["failed_groups"], 0)
+
+    def test_commit_reports_written_tables(self):
+        """Test that listeners hear about the tables a group wrote."""
+        published = []
+
+        def listener(tables):
+            published.append(tables)
+        db_events.on_commit(listener)
+        self.committer.call(insert_item, "a")
+        self.assertIn(frozenset({"items"}), published)
+
+    def test_failed_group_fails_every_call_and_recovers(self):
+        """Test that a group without a connection fails its calls only."""
+        pool = get_pool(self.database, max_size=1, acquire_timeout=0.2)
+        held = pool.acquire()
+        try:
+            futures = [self.committer.submit(insert_item, name)
+                       for name in ("a", "b", "c")]
+            for future in futures:
+                with self.assertRaises(PoolTimeout):
+                    future.result(5)
+        finally:
+            pool.release(held)
+
+        self.assertEqual(self.committer.call(insert_item, "d"), "d")
+        self.assertEqual(self.names(), ["d"])
+        stats = self.committer.stats()
+        self.assertEqual(stats["failed_groups"], 1)
+        self.assertEqual(stats["failed_calls"], 3)
+
+    def test_closed_committer_rejects_calls(self):
+        """Test that submit raises once the committer is closed."""
+        self.committer.close()
+        with self.assertRaises(RuntimeError):
+            self.committer.submit(insert_item, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,22 +1,58 @@
 #!/usr/bin/python3
 import sqlite3
+from filters import build_select, project
+from records import row_converter
 
-def stream_users():
+def stream_users(columns=None, where=None, as_records=False):
     """
     Generator function that streams rows from the user_data table one by one.
 
+    Args:
+        columns (list): Columns to fetch; all columns if None
+        where (filters.Predicate): Filter; the parts that translate to SQL
+            are pushed into the query, the rest is applied in Python
+        as_records (bool): Yield compact records.Record tuples (attribute
+            and mapping access) instead of allocating a dict per row
+
     Yields:
         dict: A dictionary containing user_id, name, email, and age
     """
+    query, params, residual = build_select("user_data", columns, where)
+
     # Connect to your SQLite database (adjust if using a different DB)
     conn = sqlite3.connect("user_data.db")
-    conn.row_factory = sqlite3.Row  # allows fetching rows as dictionaries
+    if not as_records:
+        conn.row_factory = sqlite3.Row  # allows fetching rows as dictionaries
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM user_data")
+    cursor.execute(query, params)
+
+    if as_records:
+        yield from _stream_records(cursor, columns, residual)
+        conn.close()
+        return
 
     # Only one loop as required
     for row in cursor:
+        if residual is not None:
+            if not residual(row):
+                continue
+            if columns:
+                yield project(row, columns)
+                continue
         yield dict(row)
 
     conn.close()
+
+
+def _stream_records(cursor, columns, residual):
+    """Yields the cursor's rows as records, filtered and projected."""
+    if residual is None:
+        yield from map(row_converter(cursor), cursor)
+        return
+
+    to_record = row_converter(cursor)
+    to_projected = row_converter(cursor, columns)
+    for row in cursor:
+        if residual(to_record(row)):
+            yield to_projected(row)
@@ -1,39 +1,86 @@
 #!/usr/bin/python3
 import sqlite3
+from itertools import compress
+from filters import build_select, col, project
+from records import row_converter
 
+try:
+    import numpy as np
+except ImportError:  # the columnar mode is optional
+    np = None
 
-def stream_users_in_batches(batch_size):
+
+def stream_users_in_batches(batch_size, columns=None, where=None,
+                            as_records=False):
     """
     Generator that streams rows from the user_data table in batches.
 
+    Args:
+        batch_size (int): Number of rows fetched per batch
+        columns (list): Columns to fetch; all columns if None
+        where (filters.Predicate): Filter; the parts that translate to SQL
+            are pushed into the query, the rest is applied in Python
+        as_records (bool): Yield compact records.Record tuples instead of
+            sqlite3.Row objects
+
     Yields:
-        tuple(sqlite3.Row, ...): a batch (sequence) of sqlite3.Row objects
+        list: a batch of sqlite3.Row objects (or records), or of dicts of
+        the requested columns when part of the filter had to run in Python
     """
+    query, params, residual = build_select("user_data", columns, where)
+
     conn = sqlite3.connect("user_data.db")
-    conn.row_factory = sqlite3.Row
+    if not as_records:
+        conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM user_data")
+    cursor.execute(query, params)
+    if as_records:
+        to_record = row_converter(cursor)
+        to_projected = row_converter(cursor, columns)
 
     # loop 1
     while True:
         rows = cursor.fetchmany(batch_size)
         if not rows:
             break
+        if as_records:
+            rows = list(map(to_record, rows))
+        if residual is not None:
+            rows = [row for row in rows if residual(row)]
+            if columns:
+                rows = ([to_projected(row) for row in rows] if as_records
+                        else [project(row, columns) for row in rows])
+            if not rows:
+                continue
         # yield the raw rows (conversion to dict happens later)
         yield rows
 
     conn.close()
 
 
-def batch_processing(batch_size):
+def batch_processing(batch_size, columns=None, where=None):
     """
     Generator that consumes batches and yields users older than 25.
 
+    The age filter, and any extra `where` filter, is pushed down into the
+    SQL query so younger users are never fetched.
+
+    Args:
+        batch_size (int): Number of rows fetched per batch
+        columns (list): Columns to return; age is always included
+        where (filters.Predicate): Additional filter on top of age > 25
+
     Yields:
         dict: a single user record (user_id, name, email, age)
     """
+    predicate = col("age") > 25
+    if where is not None:
+        predicate = predicate & where
+    if columns and "age" not in columns:
+        columns = list(columns) + ["age"]
+
     # loop 2 (over batches)
-    for batch in stream_users_in_batches(batch_size):
+    for batch in stream_users_in_batches(batch_size, columns, predicate):
         # loop 3 (over rows in a batch)
         for row in batch:
             user = dict(row)
@@ -41,6 +88,137 @@ def batch_processing(batch_size):
             try:
                 if int(user.get("age", 0)) > 25:
                     yield user
-            except (TypeError, ValueError):
+            except (TypeError, ValueError, OverflowError):
                 # skip rows with invalid age values
-                continue
\ No newline at end of file
+                continue
+
+
+def _numeric_column(values):
+    """
+    Converts a column of ages to a numeric array for the age > 25 mask.
+
+    Values are judged the way batch_processing's int(age) judges them:
+    ints and floats are kept (floats are truncated by the mask), strings
+    and bytes count only if int() accepts them, so "30" is 30 but "30.5"
+    is not a number. Anything int() rejects becomes NaN, which never
+    matches.
+    """
+    column = np.array(values)
+    if column.dtype.kind in "iuf":
+        return column
+    numbers = []
+    for value in values:
+        try:
+            # clamped: only how the value compares with 25 matters here
+            number = max(-2 ** 63, min(int(value), 2 ** 63))
+        except (TypeError, ValueError, OverflowError):
+            numbers.append(np.nan)
+        else:
+            numbers.append(float(number))
+    return np.array(numbers, dtype=np.float64)
+
+
+def _age_masks(cursor, batch_size):
+    """
+    Yields (rows, ages, mask) for each fetched batch: the numeric age
+    column, and which rows batch_processing would keep.
+    """
+    age_index = [d[0] for d in cursor.description].index("age")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        ages = _numeric_column([row[age_index] for row in rows])
+        if ages.dtype.kind == "f":
+            # int(age) > 25 truncates; int() rejects NaN and infinity
+            mask = (np.trunc(ages) > 25) & np.isfinite(ages)
+        else:
+            mask = ages > 25
+        yield rows, ages, mask
+
+
+def stream_column_batches(batch_size):
+    """
+    Generator that streams the user_data table as batches of NumPy columns.
+
+    Yields:
+        dict: column name -> array of that column's values for the batch;
+        age is numeric (see _numeric_column), every other column is an
+        object array
+    """
+    if np is None:
+        raise ImportError("stream_column_batches requires numpy")
+
+    conn = sqlite3.connect("user_data.db")
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM user_data")
+    names = [description[0] for description in cursor.description]
+
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield _column_batch(names, rows)
+    finally:
+        conn.close()
+
+
+def _column_batch(names, rows, ages=None):
+    """Turns fetched rows into a dict of column arrays; `ages` is the age
+    column if it was already converted."""
+    batch = {}
+    for name, values in zip(names, zip(*rows)):
+        if name == "age":
+            batch[name] = _numeric_column(values) if ages is None else ages
+        else:
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            batch[name] = column
+    return batch
+
+
+def batch_processing_columnar(batch_size, as_dicts=False):
+    """
+    Vectorized batch_processing: filters users older than 25 with a NumPy
+    mask over each batch instead of converting and testing row by row.
+
+    Only the default column-batch output is meaningfully faster than
+    batch_processing. With as_dicts=True most of the time goes into
+    building one dict per matching user, which both paths have to do;
+    skipping sqlite3.Row and the per-row int() saves only about 10-15%
+    (see bench_batch_processing.py).
+
+    Both modes keep exactly the users batch_processing yields, and the
+    dicts are identical to batch_processing's (ages keep their stored
+    value rather than the numeric one).
+
+    Args:
+        batch_size (int): Number of rows per batch
+        as_dicts (bool): Yield one dict per matching user, like
+            batch_processing, instead of filtered column batches
+
+    Yields:
+        dict: a filtered column batch (column name -> array), or a single
+        user record when as_dicts is True
+    """
+    if np is None:
+        raise ImportError("batch_processing_columnar requires numpy")
+
+    conn = sqlite3.connect("user_data.db")
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM user_data")
+    names = [description[0] for description in cursor.description]
+
+    try:
+        for rows, ages, mask in _age_masks(cursor, batch_size):
+            if not mask.any():
+                continue
+            if as_dicts:
+                for row in compress(rows, mask):
+                    yield dict(zip(names, row))
+            else:
+                batch = _column_batch(names, rows, ages)
+                yield {name: column[mask] for name, column in batch.items()}
+    finally:
+        conn.close()
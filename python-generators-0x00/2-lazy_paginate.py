@@ -1,38 +1,120 @@
 #!/usr/bin/python3
 seed = __import__('seed')
+# Re-exported: callers take page_cursor() tokens from this module
+from cursors import decode_cursor, encode_cursor, page_cursor
 
 
-def paginate_users(page_size, offset):
-    connection = seed.connect_to_prodev()
+def paginate_users(page_size, offset, connection=None):
+    own_connection = connection is None
+    if own_connection:
+        connection = seed.connect_to_prodev()
     cursor = connection.cursor(dictionary=True)
     cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
     rows = cursor.fetchall()
-    connection.close()
+    cursor.close()
+    if own_connection:
+        connection.close()
     return rows
 
 
-def lazy_paginate(page_size):
+def paginate_users_after(page_size, last_user_id=None, connection=None):
+    """
+    Fetches one page of users using keyset (seek) pagination on user_id.
+
+    Instead of skipping `offset` rows, the query seeks straight past the
+    last user_id seen on the previous page using the primary key index,
+    so every page costs the same no matter how deep it is.
+
+    Args:
+        page_size (int): Number of users to fetch
+        last_user_id (str): user_id of the last row of the previous page,
+            or None to start from the beginning
+        connection: Open connection to run on; if None a new one is opened
+            and closed for this page only
+
+    Returns:
+        list: A page of user records ordered by user_id
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = seed.connect_to_prodev()
+    cursor = connection.cursor(dictionary=True)
+    if last_user_id is None:
+        cursor.execute(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+            (page_size,)
+        )
+    else:
+        cursor.execute(
+            "SELECT * FROM user_data WHERE user_id > %s "
+            "ORDER BY user_id LIMIT %s",
+            (last_user_id, page_size)
+        )
+    rows = cursor.fetchall()
+    cursor.close()
+    if own_connection:
+        connection.close()
+    return rows
+
+
+def lazy_paginate(page_size, keyset=False, cursor=None, connection=None,
+                  pool=None):
     """
     Generator that lazily paginates through user data, fetching one page at a time.
-    
+
+    All pages are fetched over a single connection that lives as long as the
+    generator. It is released when the walk ends, or when the generator is
+    closed or garbage-collected part-way through.
+
     Args:
         page_size (int): Number of users to fetch per page
-        
+        keyset (bool): Seek on user_id instead of using LIMIT/OFFSET, so that
+            page latency stays flat as the walk goes deeper
+        cursor (str): Token from page_cursor() to resume a keyset walk after
+            a previously seen page (implies keyset=True)
+        connection: Open connection to use; it is left open for the caller
+        pool: Connection pool (see seed.connect_to_prodev_pool) to borrow a
+            connection from for the whole walk instead of opening one
+
     Yields:
         list: A page of user records (each user is a dictionary)
     """
-    offset = 0
-    
-    while True:
-        # Fetch the next page of users
-        page = paginate_users(page_size, offset)
-        
-        # If no more users, break the loop
-        if not page:
-            break
-            
-        # Yield the current page
-        yield page
-        
-        # Move to the next page
-        offset += page_size
\ No newline at end of file
+    own_connection = connection is None
+    if own_connection:
+        connection = (pool.get_connection() if pool is not None
+                      else seed.connect_to_prodev())
+
+    try:
+        if keyset or cursor is not None:
+            last_user_id = decode_cursor(cursor) if cursor is not None else None
+
+            while True:
+                page = paginate_users_after(page_size, last_user_id, connection)
+                if not page:
+                    break
+                yield page
+                if len(page) < page_size:
+                    break
+                last_user_id = page[-1]["user_id"]
+            return
+
+        offset = 0
+
+        while True:
+            # Fetch the next page of users
+            page = paginate_users(page_size, offset, connection)
+
+            # If no more users, break the loop
+            if not page:
+                break
+
+            # Yield the current page
+            yield page
+
+            # Move to the next page
+            offset += page_size
+    finally:
+        # Runs on exhaustion, close() and garbage collection alike; a pooled
+        # connection's close() hands it back to the pool
+        if own_connection:
+            connection.close()
@@ -2,50 +2,80 @@
 import sqlite3
 
 
-def stream_user_ages():
+def stream_user_age_blocks(block_size=1000):
     """
-    Generator that streams user ages one by one from the database.
-    
+    Generator that streams user ages in blocks fetched with fetchmany.
+
+    Args:
+        block_size (int): Number of rows to fetch per round trip
+
     Yields:
-        int: The age of a single user
+        list: Up to block_size non-null ages
     """
     conn = sqlite3.connect("user_data.db")
     cursor = conn.cursor()
-    cursor.execute("SELECT age FROM user_data")
-    
-    # First loop: iterate through database rows
-    while True:
-        row = cursor.fetchone()
-        if row is None:
-            break
-        age = row[0]
-        if age is not None:  # Skip null ages
-            yield age
-    
-    conn.close()
-
-
-def calculate_average_age():
+    cursor.execute("SELECT age FROM user_data WHERE age IS NOT NULL")
+
+    try:
+        while True:
+            rows = cursor.fetchmany(block_size)
+            if not rows:
+                break
+            yield [row[0] for row in rows]
+    finally:
+        conn.close()
+
+
+def stream_user_ages(block_size=1000):
+    """
+    Generator that streams user ages one by one from the database.
+
+    Args:
+        block_size (int): Number of rows fetched from the database at a time
+
+    Yields:
+        int: The age of a single user
+    """
+    # First loop: iterate through blocks of database rows
+    for block in stream_user_age_blocks(block_size):
+        yield from block
+
+
+def calculate_average_age(pushdown=False):
     """
-    Calculates the average age of users using the stream_user_ages generator.
-    
+    Calculates the average age of users from the streamed blocks of ages.
+
+    Args:
+        pushdown (bool): Let the database compute AVG(age) instead of
+            streaming every age into Python
+
     Returns:
         float: The average age of users
     """
+    if pushdown:
+        conn = sqlite3.connect("user_data.db")
+        try:
+            (average,) = conn.execute(
+                "SELECT AVG(age) FROM user_data"
+            ).fetchone()
+        finally:
+            conn.close()
+        return float(average) if average is not None else 0.0
+
     total_age = 0
     count = 0
-    
-    # Second loop: iterate through the generator
-    for age in stream_user_ages():
-        total_age += age
-        count += 1
-    
+
+    # Second loop: iterate through the generator, summing whole blocks
+    for block in stream_user_age_blocks():
+        total_age += sum(block)
+        count += len(block)
+
     if count == 0:
         return 0.0
-    
+
     return total_age / count
 
 
 if __name__ == "__main__":
     average_age = calculate_average_age()
-    print(f"Average age of users: {average_age}")
\ No newline at end of file
+    print(f"Average age of users: {average_age}")
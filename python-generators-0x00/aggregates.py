@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+"""
+One-pass streaming aggregates over user ages.
+
+Computes count/sum/mean/min/max/variance (Welford) and approximate
+percentiles (P-squared) over the blocks produced by stream_user_age_blocks,
+or pushes the aggregation down to SQL when no Python predicate is needed.
+"""
+import math
+import sqlite3
+stream_ages = __import__('4-stream_ages')
+
+
+class RunningStats:
+    """
+    Running count, sum, mean, min, max and variance of a stream of numbers.
+
+    Values can be added one at a time (Welford's update) or a whole block
+    at a time; blocks and other RunningStats are combined with Chan's
+    parallel formula, so partial results can be merged in any order.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def from_sums(cls, count, total, minimum, maximum, squares):
+        """Builds the aggregates from SQL COUNT/SUM/MIN/MAX/SUM(x*x)."""
+        stats = cls()
+        if count:
+            stats.count = count
+            stats.total = total
+            stats.mean = total / count
+            stats.m2 = max(squares - total * total / count, 0.0)
+            stats.min = minimum
+            stats.max = maximum
+        return stats
+
+    def add(self, value):
+        """Adds a single value."""
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def update(self, values):
+        """Adds a block of values."""
+        if not values:
+            return
+        block = RunningStats()
+        block.count = len(values)
+        block.total = sum(values)
+        block.mean = block.total / block.count
+        block.m2 = sum((v - block.mean) ** 2 for v in values)
+        block.min = min(values)
+        block.max = max(values)
+        self.merge(block)
+
+    def merge(self, other):
+        """Folds another RunningStats into this one."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Population variance."""
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        """Population standard deviation."""
+        return math.sqrt(self.variance)
+
+    def as_dict(self):
+        """Returns the aggregates as a plain dict."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "variance": self.variance,
+            "stddev": self.stddev,
+        }
+
+
+class P2Quantile:
+    """
+    Approximate quantile of a stream in O(1) memory (Jain & Chlamtac's P^2).
+
+    Tracks five markers whose heights converge on the minimum, p/2, p,
+    (1+p)/2 quantiles and the maximum of everything seen so far.
+    """
+
+    def __init__(self, p):
+        if not 0 < p < 1:
+            raise ValueError("p must be between 0 and 1")
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        """Adds a single value."""
+        q = self.heights
+        if len(q) < 5:
+            q.append(value)
+            q.sort()
+            return
+
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or \
+                    (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def update(self, values):
+        """Adds a block of values."""
+        for value in values:
+            self.add(value)
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self):
+        """The current estimate, or None if nothing has been added."""
+        q = self.heights
+        if not q:
+            return None
+        if len(q) < 5:
+            # Exact nearest-rank quantile of the few values seen so far
+            return q[min(len(q) - 1, int(self.p * len(q)))]
+        return q[2]
+
+
+def pushdown_age_stats():
+    """
+    Computes the age aggregates inside SQLite in a single query.
+
+    Returns:
+        RunningStats: The aggregates of all non-null ages
+    """
+    conn = sqlite3.connect("user_data.db")
+    try:
+        sums = conn.execute(
+            "SELECT COUNT(age), SUM(age), MIN(age), MAX(age), SUM(age * age) "
+            "FROM user_data WHERE age IS NOT NULL"
+        ).fetchone()
+    finally:
+        conn.close()
+    return RunningStats.from_sums(*sums)
+
+
+def summarize_ages(predicate=None, percentiles=(), block_size=1000,
+                   pushdown=True):
+    """
+    Computes aggregates of user ages in one pass.
+
+    Args:
+        predicate (callable): Optional filter; only ages for which
+            predicate(age) is true are aggregated
+        percentiles (iterable): Quantiles in (0, 1) to estimate, e.g.
+            (0.5, 0.9, 0.99)
+        block_size (int): Number of rows fetched per round trip
+        pushdown (bool): Let SQL compute the aggregates when there is no
+            predicate and no percentiles are requested
+
+    Returns:
+        dict: count, sum, mean, min, max, variance, stddev and, for each
+        requested quantile p, a "p<percent>" key such as "p50" or "p99"
+    """
+    percentiles = tuple(percentiles)
+    if pushdown and predicate is None and not percentiles:
+        return pushdown_age_stats().as_dict()
+
+    stats = RunningStats()
+    estimators = [P2Quantile(p) for p in percentiles]
+
+    for block in stream_ages.stream_user_age_blocks(block_size):
+        if predicate is not None:
+            block = [age for age in block if predicate(age)]
+        stats.update(block)
+        for estimator in estimators:
+            estimator.update(block)
+
+    summary = stats.as_dict()
+    for estimator in estimators:
+        summary[f"p{estimator.p * 100:g}"] = estimator.value
+    return summary
+
+
+if __name__ == "__main__":
+    print(summarize_ages(percentiles=(0.5, 0.9, 0.99)))
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""
+Async-generator counterparts of stream_users, stream_users_in_batches and
+lazy_paginate for asyncio services, built on aiosqlite.
+
+Rows are pulled from SQLite in fetchmany blocks only as the consumer asks
+for them, so a slow consumer never causes the whole table to be buffered,
+and the queries run on aiosqlite's worker thread instead of the event loop.
+"""
+import aiosqlite
+from filters import build_select, project
+from cursors import decode_cursor
+
+
+async def async_stream_users_in_batches(batch_size, columns=None, where=None):
+    """
+    Async generator that streams rows from the user_data table in batches.
+
+    Args:
+        batch_size (int): Number of rows fetched per batch
+        columns (list): Columns to fetch; all columns if None
+        where (filters.Predicate): Filter, pushed down to SQL where possible
+
+    Yields:
+        list: a batch of user records (dicts)
+    """
+    query, params, residual = build_select("user_data", columns, where)
+
+    async with aiosqlite.connect("user_data.db") as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(query, params) as cursor:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if residual is not None:
+                    rows = [row for row in rows if residual(row)]
+                    if columns:
+                        if rows:
+                            yield [project(row, columns) for row in rows]
+                        continue
+                if rows:
+                    yield [dict(row) for row in rows]
+
+
+async def async_stream_users(columns=None, where=None, block_size=500):
+    """
+    Async generator that streams rows from the user_data table one by one.
+
+    Args:
+        columns (list): Columns to fetch; all columns if None
+        where (filters.Predicate): Filter, pushed down to SQL where possible
+        block_size (int): Number of rows fetched from SQLite at a time
+
+    Yields:
+        dict: A dictionary containing user_id, name, email, and age
+    """
+    async for batch in async_stream_users_in_batches(block_size, columns,
+                                                     where):
+        for user in batch:
+            yield user
+
+
+async def async_lazy_paginate(page_size, cursor=None):
+    """
+    Async generator that lazily paginates through user_data with keyset
+    pagination on user_id, over one connection for the whole walk.
+
+    Args:
+        page_size (int): Number of users to fetch per page
+        cursor (str): Token from page_cursor() to resume after a page
+
+    Yields:
+        list: A page of user records (each user is a dictionary)
+    """
+    last_user_id = decode_cursor(cursor) if cursor is not None else None
+
+    async with aiosqlite.connect("user_data.db") as db:
+        db.row_factory = aiosqlite.Row
+        while True:
+            if last_user_id is None:
+                query = "SELECT * FROM user_data ORDER BY user_id LIMIT ?"
+                params = (page_size,)
+            else:
+                query = ("SELECT * FROM user_data WHERE user_id > ? "
+                         "ORDER BY user_id LIMIT ?")
+                params = (last_user_id, page_size)
+            async with db.execute(query, params) as result:
+                page = [dict(row) for row in await result.fetchall()]
+            if not page:
+                break
+            yield page
+            if len(page) < page_size:
+                break
+            last_user_id = page[-1]["user_id"]
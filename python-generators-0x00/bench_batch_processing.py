@@ -0,0 +1,37 @@
+#!/usr/bin/python3
+"""
+Benchmark: per-row batch_processing vs the NumPy columnar batch mode.
+
+Usage: ./bench_batch_processing.py [rows] [batch_size]
+"""
+import sys
+from bench_utils import synthetic_user_db, timed
+batch_processing = __import__('1-batch_processing')
+
+
+def count(iterable):
+    """Consumes an iterable and returns how many items it produced."""
+    return sum(1 for _ in iterable)
+
+
+def count_rows(batches):
+    """Consumes column batches and returns the total number of rows."""
+    return sum(len(batch["age"]) for batch in batches)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    with synthetic_user_db(rows):
+        print(f"{rows} rows, batch_size={batch_size}")
+        expected = timed("per-row dicts (batch_processing)", count,
+                         batch_processing.batch_processing(batch_size))
+        matched = timed("columnar, dicts for matches", count,
+                        batch_processing.batch_processing_columnar(
+                            batch_size, as_dicts=True))
+        columnar = timed("columnar, column batches", count_rows,
+                         batch_processing.batch_processing_columnar(
+                             batch_size))
+        assert expected == matched == columnar, (expected, matched, columnar)
+        print(f"{expected} users older than 25")
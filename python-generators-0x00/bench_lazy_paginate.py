@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""
+Benchmark: page latency of OFFSET pagination vs keyset pagination.
+
+Walks user_data in ALX_prodev with both modes of lazy_paginate and prints
+the average latency of the pages fetched around each depth. OFFSET latency
+grows with depth; keyset latency should stay flat.
+
+Usage: ./bench_lazy_paginate.py [page_size] [max_pages]
+"""
+import sys
+import time
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+
+
+def time_pages(pages, max_pages):
+    """Returns the latency in ms of each page pulled from a page generator."""
+    latencies = []
+    start = time.perf_counter()
+    for page in pages:
+        now = time.perf_counter()
+        latencies.append((now - start) * 1000)
+        if len(latencies) >= max_pages:
+            pages.close()
+            break
+        start = time.perf_counter()
+    return latencies
+
+
+def report(label, latencies, buckets=10):
+    """Prints average latency per depth bucket."""
+    print(label)
+    if not latencies:
+        print("  (no rows)")
+        return
+    step = max(1, len(latencies) // buckets)
+    for i in range(0, len(latencies), step):
+        chunk = latencies[i:i + step]
+        print(f"  pages {i:>6}-{i + len(chunk) - 1:<6} "
+              f"avg {sum(chunk) / len(chunk):8.2f} ms")
+
+
+if __name__ == "__main__":
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    report("OFFSET pagination",
+           time_pages(lazy_paginate(page_size), max_pages))
+    report("Keyset pagination",
+           time_pages(lazy_paginate(page_size, keyset=True), max_pages))
@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+"""
+Benchmark: parallel_scan / parallel_average_age scaling by worker count.
+
+Usage: ./bench_parallel_scan.py [rows] [max_workers]
+"""
+import os
+import sys
+from bench_utils import synthetic_user_db, timed
+from filters import col, where
+import parallel_scan
+
+
+def is_gmail(user):
+    """A Python-only predicate, so the workers do real per-row work."""
+    return user["email"].endswith("@gmail.com")
+
+
+def count(iterable):
+    """Consumes an iterable and returns how many items it produced."""
+    return sum(1 for _ in iterable)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with synthetic_user_db(rows):
+        print(f"{rows} rows")
+        workers = 1
+        while workers <= max_workers:
+            timed(f"scan, python filter, {workers} workers", count,
+                  parallel_scan.parallel_scan(
+                      where=(col("age") > 25) & ~where(is_gmail),
+                      workers=workers))
+            timed(f"average age, {workers} workers",
+                  parallel_scan.parallel_average_age,
+                  where=where(is_gmail) | (col("age") > 25),
+                  workers=workers)
+            workers *= 2
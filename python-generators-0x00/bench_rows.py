@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+"""
+Benchmark: dict rows vs compact records in stream_users.
+
+Measures streaming throughput and the memory needed to hold every row.
+
+Usage: ./bench_rows.py [rows]
+"""
+import gc
+import sys
+import tracemalloc
+from bench_utils import synthetic_user_db, timed
+stream_users = __import__('0-stream_users').stream_users
+
+
+def drain(rows):
+    """Consumes rows one by one and returns how many there were."""
+    count = 0
+    for _ in rows:
+        count += 1
+    return count
+
+
+def retained_bytes(rows):
+    """Returns the traced memory held by the materialized rows."""
+    gc.collect()
+    tracemalloc.start()
+    held = list(rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with synthetic_user_db(rows):
+        print(f"{rows} rows")
+        timed("stream dicts", drain, stream_users())
+        timed("stream records", drain, stream_users(as_records=True))
+        for label, as_records in (("dicts", False), ("records", True)):
+            size = retained_bytes(stream_users(as_records=as_records))
+            print(f"{'held ' + label:<40} {size / rows:10.1f} bytes/row")
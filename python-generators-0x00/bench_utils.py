@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""Helpers shared by the bench_*.py scripts."""
+import contextlib
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+
+@contextlib.contextmanager
+def synthetic_user_db(rows, seed=0):
+    """
+    Creates a temporary user_data.db with `rows` random users and makes its
+    directory the working directory for the duration of the block, so the
+    generator modules (which open "user_data.db") read from it.
+
+    Yields:
+        str: Path of the temporary database
+    """
+    rng = random.Random(seed)
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "user_data.db")
+        conn = sqlite3.connect(path)
+        conn.execute("""
+            CREATE TABLE user_data (
+                user_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                age INTEGER NOT NULL
+            )
+        """)
+        with conn:
+            conn.executemany(
+                "INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                ((str(uuid.UUID(int=rng.getrandbits(128))), f"User {i}",
+                  f"user{i}@example.com", rng.randint(18, 100))
+                 for i in range(rows))
+            )
+        conn.close()
+        os.chdir(directory)
+        try:
+            yield path
+        finally:
+            os.chdir(previous)
+
+
+def timed(label, func, *args, **kwargs):
+    """Runs func once and prints how long it took; returns its result."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return result
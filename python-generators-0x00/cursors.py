@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""
+Opaque pagination cursor tokens shared by the sync (MySQL) and async
+(SQLite) paginators; free of database driver imports.
+"""
+import base64
+
+
+def encode_cursor(user_id):
+    """
+    Encodes a user_id into an opaque, URL-safe cursor token.
+
+    Args:
+        user_id (str): The user_id to resume after
+
+    Returns:
+        str: The cursor token
+    """
+    return base64.urlsafe_b64encode(user_id.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """
+    Decodes a cursor token produced by encode_cursor.
+
+    Args:
+        token (str): The cursor token
+
+    Returns:
+        str: The user_id the token points after
+
+    Raises:
+        ValueError: If the token is not a valid cursor
+    """
+    try:
+        return base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {token!r}") from e
+
+
+def page_cursor(page):
+    """
+    Returns the cursor token that resumes pagination after the given page.
+
+    Args:
+        page (list): A page yielded by lazy_paginate(..., keyset=True)
+
+    Returns:
+        str: The cursor token, or None if the page is empty
+    """
+    if not page:
+        return None
+    return encode_cursor(page[-1]["user_id"])
@@ -0,0 +1,311 @@
+#!/usr/bin/python3
+"""
+Composable row filters and projections for the streaming generators.
+
+Predicates built from col() compile to a SQL WHERE clause so the database
+discards rows before they are shipped to Python; anything that cannot be
+translated (e.g. where(callable)) is evaluated in Python on each row.
+
+    >>> is_gmail = where(lambda user: user["email"].endswith("@gmail.com"))
+    >>> sql, params, residual = compile_filter((col("age") > 25) & is_gmail)
+    >>> sql, params
+    ('(age > CAST(? AS NUMERIC))', [25])
+"""
+import abc
+import operator
+import re
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class Untranslatable(Exception):
+    """Raised when a predicate has no SQL equivalent."""
+
+
+def quote_identifier(name):
+    """Validates a column name so it can be placed in SQL text."""
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return name
+
+
+class Predicate(abc.ABC):
+    """Base class of row predicates."""
+
+    def to_sql(self, placeholder="?"):
+        """
+        Returns (sql, params) for this predicate.
+
+        Raises:
+            Untranslatable: If the predicate must be evaluated in Python
+        """
+        raise Untranslatable(self)
+
+    @abc.abstractmethod
+    def __call__(self, row):
+        """Returns True if the row matches, evaluated in Python."""
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Comparison(Predicate):
+    """
+    column <op> value
+
+    Numeric values are compared as numbers in SQLite even when the column
+    has TEXT affinity: the parameter is cast to NUMERIC, so SQLite converts
+    the column's numeric-looking text ('100') before comparing instead of
+    comparing the number as text ('100' < '25'). Casting the parameter
+    rather than the column keeps rowid and index lookups usable; on
+    INTEGER/REAL columns it changes nothing. Text that does not look like a
+    number still sorts after every number, as in any SQLite comparison.
+    """
+
+    _OPERATORS = {
+        "=": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+    }
+
+    def __init__(self, column, op, value):
+        self.column = quote_identifier(column)
+        self.op = op
+        self.value = value
+
+    def to_sql(self, placeholder="?"):
+        if (placeholder == "?" and isinstance(self.value, (int, float))
+                and not isinstance(self.value, bool)):
+            # MySQL already compares strings with numbers as numbers
+            placeholder = f"CAST({placeholder} AS NUMERIC)"
+        return f"{self.column} {self.op} {placeholder}", [self.value]
+
+    def __call__(self, row):
+        value = row[self.column]
+        # Comparisons with NULL are never true in SQL
+        if value is None:
+            return False
+        return self._OPERATORS[self.op](value, self.value)
+
+    def __repr__(self):
+        return f"({self.column} {self.op} {self.value!r})"
+
+
+class In(Predicate):
+    """column IN (values...)"""
+
+    def __init__(self, column, values):
+        self.column = quote_identifier(column)
+        self.values = list(values)
+
+    def to_sql(self, placeholder="?"):
+        if not self.values:
+            return "0 = 1", []
+        marks = ", ".join([placeholder] * len(self.values))
+        return f"{self.column} IN ({marks})", list(self.values)
+
+    def __call__(self, row):
+        return row[self.column] in self.values
+
+    def __repr__(self):
+        return f"({self.column} IN {self.values!r})"
+
+
+class IsNull(Predicate):
+    """column IS NULL"""
+
+    def __init__(self, column):
+        self.column = quote_identifier(column)
+
+    def to_sql(self, placeholder="?"):
+        return f"{self.column} IS NULL", []
+
+    def __call__(self, row):
+        return row[self.column] is None
+
+    def __repr__(self):
+        return f"({self.column} IS NULL)"
+
+
+class And(Predicate):
+    def __init__(self, *predicates):
+        # Flatten nested ANDs so each term can be pushed down on its own
+        self.predicates = tuple(
+            term
+            for predicate in predicates
+            for term in (predicate.predicates if isinstance(predicate, And)
+                         else (predicate,))
+        )
+
+    def to_sql(self, placeholder="?"):
+        return _join(" AND ", self.predicates, placeholder)
+
+    def __call__(self, row):
+        return all(predicate(row) for predicate in self.predicates)
+
+    def __repr__(self):
+        return "(" + " AND ".join(map(repr, self.predicates)) + ")"
+
+
+class Or(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def to_sql(self, placeholder="?"):
+        return _join(" OR ", self.predicates, placeholder)
+
+    def __call__(self, row):
+        return any(predicate(row) for predicate in self.predicates)
+
+    def __repr__(self):
+        return "(" + " OR ".join(map(repr, self.predicates)) + ")"
+
+
+class Not(Predicate):
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def to_sql(self, placeholder="?"):
+        sql, params = self.predicate.to_sql(placeholder)
+        return f"NOT ({sql})", params
+
+    def __call__(self, row):
+        return not self.predicate(row)
+
+    def __repr__(self):
+        return f"(NOT {self.predicate!r})"
+
+
+class PythonPredicate(Predicate):
+    """Wraps an arbitrary callable; always evaluated in Python."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, row):
+        return bool(self.func(row))
+
+    def __repr__(self):
+        return f"where({getattr(self.func, '__name__', self.func)!r})"
+
+
+def _join(separator, predicates, placeholder):
+    parts, params = [], []
+    for predicate in predicates:
+        sql, predicate_params = predicate.to_sql(placeholder)
+        parts.append(f"({sql})")
+        params.extend(predicate_params)
+    return separator.join(parts), params
+
+
+class Column:
+    """A column reference; comparison operators build predicates."""
+
+    __hash__ = None
+
+    def __init__(self, name):
+        self.name = quote_identifier(name)
+
+    def __eq__(self, value):
+        return Comparison(self.name, "=", value)
+
+    def __ne__(self, value):
+        return Comparison(self.name, "!=", value)
+
+    def __lt__(self, value):
+        return Comparison(self.name, "<", value)
+
+    def __le__(self, value):
+        return Comparison(self.name, "<=", value)
+
+    def __gt__(self, value):
+        return Comparison(self.name, ">", value)
+
+    def __ge__(self, value):
+        return Comparison(self.name, ">=", value)
+
+    def isin(self, values):
+        return In(self.name, values)
+
+    def is_null(self):
+        return IsNull(self.name)
+
+
+def col(name):
+    """Returns a Column for building predicates, e.g. col("age") > 25."""
+    return Column(name)
+
+
+def where(func):
+    """Wraps a Python callable taking a row as a predicate."""
+    return PythonPredicate(func)
+
+
+def compile_filter(predicate, placeholder="?"):
+    """
+    Splits a predicate into the part SQL can evaluate and a Python residual.
+
+    Top-level AND terms are pushed down individually, so only the terms
+    that cannot be translated are left for Python.
+
+    Args:
+        predicate (Predicate): The filter, or None
+        placeholder (str): Parameter marker ("?" for sqlite3, "%s" for MySQL)
+
+    Returns:
+        tuple: (sql, params, residual) where sql is a WHERE condition or
+        None, and residual is a Predicate to apply in Python or None
+    """
+    if predicate is None:
+        return None, [], None
+
+    terms = predicate.predicates if isinstance(predicate, And) else (predicate,)
+    pushed, residual = [], []
+    for term in terms:
+        try:
+            term.to_sql(placeholder)
+        except Untranslatable:
+            residual.append(term)
+        else:
+            pushed.append(term)
+
+    sql, params = (_join(" AND ", pushed, placeholder) if pushed
+                   else (None, []))
+    if not residual:
+        return sql, params, None
+    return sql, params, residual[0] if len(residual) == 1 else And(*residual)
+
+
+def build_select(table, columns=None, predicate=None, placeholder="?"):
+    """
+    Builds a SELECT over `table` with the given projection and filter.
+
+    If part of the filter has to run in Python, all columns are selected so
+    the residual can see them; project() then trims each row.
+
+    Returns:
+        tuple: (sql, params, residual)
+    """
+    condition, params, residual = compile_filter(predicate, placeholder)
+    if columns and residual is None:
+        select_list = ", ".join(quote_identifier(c) for c in columns)
+    else:
+        select_list = "*"
+    sql = f"SELECT {select_list} FROM {quote_identifier(table)}"
+    if condition:
+        sql += f" WHERE {condition}"
+    return sql, params, residual
+
+
+def project(row, columns):
+    """Returns a dict of only the requested columns of a row."""
+    return {column: row[column] for column in columns}
@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+"""
+Range-partitioned parallel scans of user_data across a process pool.
+
+The table is split into rowid ranges; each range is read by a worker
+process over its own read-only connection. Row scans are yielded back in
+rowid order, and age aggregates are merged as a reduction.
+
+Python-side predicates (filters.where) are sent to the workers by pickle,
+so they must be module-level functions rather than lambdas.
+"""
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from aggregates import RunningStats
+from filters import build_select, col, compile_filter, project
+
+# Aggregates of one range, in the argument order of RunningStats.from_sums
+_AGE_SUMS = "COUNT(age), SUM(age), MIN(age), MAX(age), SUM(age * age)"
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro",
+                           uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def partition_ranges(partitions, db_path="user_data.db"):
+    """
+    Splits the rowid space of user_data into contiguous ranges.
+
+    Args:
+        partitions (int): Number of ranges to produce
+        db_path (str): The SQLite database
+
+    Returns:
+        list: (low, high) pairs covering low <= rowid < high, in order
+    """
+    conn = _connect(db_path)
+    try:
+        low, high = conn.execute(
+            "SELECT MIN(rowid), MAX(rowid) FROM user_data"
+        ).fetchone()
+    finally:
+        conn.close()
+    if low is None:
+        return []
+
+    span = high - low + 1
+    partitions = max(1, min(partitions, span))
+    step = -(-span // partitions)
+    return [(start, min(start + step, high + 1))
+            for start in range(low, high + 1, step)]
+
+
+def _range_predicate(low, high, where):
+    predicate = (col("rowid") >= low) & (col("rowid") < high)
+    return predicate & where if where is not None else predicate
+
+
+def _scan_range(task):
+    """Worker: returns the matching rows of one rowid range as dicts."""
+    db_path, (low, high), columns, where = task
+    query, params, residual = build_select(
+        "user_data", columns, _range_predicate(low, high, where))
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(query + " ORDER BY rowid", params).fetchall()
+    finally:
+        conn.close()
+    if residual is None:
+        return [dict(row) for row in rows]
+    return [project(row, columns) if columns else dict(row)
+            for row in rows if residual(row)]
+
+
+def _age_stats_range(task):
+    """Worker: returns the RunningStats of ages in one rowid range."""
+    db_path, (low, high), where = task
+    predicate = _range_predicate(low, high, where) & ~col("age").is_null()
+    conn = _connect(db_path)
+    try:
+        condition, params, residual = compile_filter(predicate)
+        if residual is None:
+            # Everything translated: aggregate inside SQLite
+            sums = conn.execute(
+                f"SELECT {_AGE_SUMS} FROM user_data WHERE {condition}",
+                params).fetchone()
+            return RunningStats.from_sums(*sums)
+
+        query, params, residual = build_select("user_data", ["age"],
+                                               predicate)
+        stats = RunningStats()
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            stats.update([row["age"] for row in rows if residual(row)])
+        return stats
+    finally:
+        conn.close()
+
+
+def _plan(workers, partitions, db_path):
+    workers = workers or os.cpu_count() or 1
+    # Several ranges per worker keeps the pool busy if ranges are uneven
+    return workers, partition_ranges(partitions or workers * 4, db_path)
+
+
+def _ordered_results(executor, func, tasks, window):
+    """
+    Like executor.map, but with at most `window` tasks submitted at once.
+
+    executor.map submits every task up front, so results pile up in memory
+    while the consumer works through the first ones; here the next task is
+    only submitted as the oldest result is taken.
+    """
+    tasks = iter(tasks)
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(executor.submit(func, task))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.popleft().result()
+            for task in tasks:
+                pending.append(executor.submit(func, task))
+                break
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def parallel_scan(columns=None, where=None, workers=None, partitions=None,
+                  db_path="user_data.db"):
+    """
+    Generator that scans user_data in parallel, yielding rows in rowid order.
+
+    At most two ranges per worker are in flight, so memory stays bounded
+    by the ranges being read rather than by the table.
+
+    Args:
+        columns (list): Columns to fetch; all columns if None
+        where (filters.Predicate): Filter, pushed down to SQL where possible
+        workers (int): Worker processes; defaults to the CPU count
+        partitions (int): Number of rowid ranges; defaults to 4 per worker
+        db_path (str): The SQLite database
+
+    Yields:
+        dict: A user record
+    """
+    workers, ranges = _plan(workers, partitions, db_path)
+    tasks = [(db_path, r, columns, where) for r in ranges]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in _ordered_results(executor, _scan_range, tasks,
+                                     workers * 2):
+            yield from rows
+
+
+def parallel_age_stats(where=None, workers=None, partitions=None,
+                       db_path="user_data.db"):
+    """
+    Computes age aggregates over user_data in parallel.
+
+    Each worker aggregates its rowid range (in SQL when the filter fully
+    translates) and the partial RunningStats are merged.
+
+    Returns:
+        aggregates.RunningStats: The merged aggregates
+    """
+    workers, ranges = _plan(workers, partitions, db_path)
+    stats = RunningStats()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_age_stats_range,
+                                    [(db_path, r, where) for r in ranges]):
+            stats.merge(partial)
+    return stats
+
+
+def parallel_average_age(where=None, workers=None, partitions=None,
+                         db_path="user_data.db"):
+    """
+    Parallel counterpart of calculate_average_age.
+
+    Returns:
+        float: The average age of users
+    """
+    stats = parallel_age_stats(where, workers, partitions, db_path)
+    return stats.mean if stats.count else 0.0
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+"""
+Compact row records for the streaming generators.
+
+A record is a tuple subclass with __slots__ = () generated once per result
+shape from the cursor description, so creating one per row costs a single
+tuple allocation instead of a dict. Records support attribute access
+(row.age), mapping access (row["age"], keys(), get(), items()) and
+dict(row).
+"""
+import operator
+from functools import lru_cache
+
+_RESERVED = {"keys", "values", "items", "get"}
+
+
+class Record(tuple):
+    """Base class of generated record types."""
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    _make = classmethod(tuple.__new__)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}"
+                           for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        # Generated classes are not importable by name, so pickle by shape
+        return _rebuild, (self._fields, tuple(self))
+
+
+@lru_cache(maxsize=128)
+def _record_type(fields):
+    namespace = {
+        "__slots__": (),
+        "_fields": fields,
+        "_index": {name: i for i, name in enumerate(fields)},
+    }
+    for i, name in enumerate(fields):
+        if name.isidentifier() and not name.startswith("_") \
+                and name not in _RESERVED:
+            namespace[name] = property(operator.itemgetter(i))
+    return type("Row", (Record,), namespace)
+
+
+def record_type(fields):
+    """Returns the (cached) record class for the given column names."""
+    return _record_type(tuple(fields))
+
+
+def _rebuild(fields, values):
+    return record_type(fields)._make(values)
+
+
+def row_converter(cursor, columns=None):
+    """
+    Returns a function turning the cursor's plain tuple rows into records.
+
+    Args:
+        cursor: A cursor that has executed its query
+        columns (list): If given, only these columns (by name) are kept
+
+    Returns:
+        callable: tuple row -> Record
+    """
+    names = [description[0] for description in cursor.description]
+    if not columns or list(columns) == names:
+        return record_type(names)._make
+
+    indices = [names.index(column) for column in columns]
+    make = record_type(columns)._make
+    return lambda row: make([row[i] for i in indices])
@@ -1,8 +1,16 @@
 #!/usr/bin/python3
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector import pooling
 import csv
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 
 def connect_db():
@@ -31,14 +39,19 @@ def create_database(connection):
         print(f"Error creating database: {e}")
 
 
-def connect_to_prodev():
-    """Connect to ALX_prodev database."""
+def connect_to_prodev(**options):
+    """Connect to ALX_prodev database.
+
+    Extra keyword options (e.g. allow_local_infile=True) are passed on to
+    mysql.connector.connect.
+    """
     try:
         connection = mysql.connector.connect(
             host="localhost",
             user="root",      # change if needed
             password="root",  # change if needed
-            database="ALX_prodev"
+            database="ALX_prodev",
+            **options
         )
         if connection.is_connected():
             return connection
@@ -47,6 +60,26 @@ def connect_to_prodev():
         return None
 
 
+def connect_to_prodev_pool(pool_size=5, pool_name="prodev_pool"):
+    """Create a pool of reusable connections to the ALX_prodev database.
+
+    Connections are borrowed with pool.get_connection(); calling close() on a
+    borrowed connection returns it to the pool instead of disconnecting.
+    """
+    try:
+        return pooling.MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            host="localhost",
+            user="root",      # change if needed
+            password="root",  # change if needed
+            database="ALX_prodev"
+        )
+    except Error as e:
+        print(f"Error creating ALX_prodev connection pool: {e}")
+        return None
+
+
 def create_table(connection):
     """Create user_data table if it does not exist."""
     try:
@@ -57,7 +90,8 @@ def create_table(connection):
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) NOT NULL,
                 age DECIMAL NOT NULL,
-                INDEX(user_id)
+                INDEX(user_id),
+                UNIQUE KEY uq_user_data_email (email)
             );
         """)
         connection.commit()
@@ -67,29 +101,255 @@ def create_table(connection):
         print(f"Error creating table: {e}")
 
 
-def insert_data(connection, csv_file):
-    """Insert data from CSV into user_data table if not already present."""
+def ensure_email_index(connection):
+    """Add the UNIQUE email index to a user_data table created without it.
+
+    Returns True once the index exists. Returns False if it could not be
+    added, e.g. because the table already holds duplicate emails; INSERT
+    IGNORE does not skip duplicates without it, so callers must not load.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+              AND table_name = 'user_data'
+              AND index_name = 'uq_user_data_email'
+        """)
+        (exists,) = cursor.fetchone()
+        if not exists:
+            cursor.execute(
+                "ALTER TABLE user_data "
+                "ADD UNIQUE KEY uq_user_data_email (email)"
+            )
+            connection.commit()
+        cursor.close()
+        return True
+    except Error as e:
+        print(f"Error creating email index: {e}")
+        return False
+
+
+def ensure_sqlite_email_index(connection):
+    """SQLite counterpart of ensure_email_index.
+
+    A user_data table created without `email UNIQUE` gets a unique index,
+    so INSERT OR IGNORE drops duplicate emails there too. Raises
+    sqlite3.IntegrityError if the table already holds duplicate emails.
+    """
+    connection.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_data_email "
+        "ON user_data (email)"
+    )
+
+
+def insert_data(connection, csv_file, chunk_size=5000):
+    """Insert data from CSV into user_data table if not already present.
+
+    The CSV is streamed in chunks of `chunk_size` rows, each sent as a single
+    multi-row INSERT IGNORE. Duplicate emails are skipped by the UNIQUE index
+    on email rather than by a lookup per row.
+
+    Returns the number of rows inserted, or None on error (including when
+    the email index is missing and cannot be added).
+    """
+    if not ensure_email_index(connection):
+        print("Not inserting data: duplicate emails would not be skipped")
+        return None
     try:
         cursor = connection.cursor()
+        read = inserted = 0
+        start = time.perf_counter()
         with open(csv_file, newline='', encoding="utf-8") as file:
             reader = csv.DictReader(file)
-            for row in reader:
-                # generate uuid if not provided
-                user_id = str(uuid.uuid4())
-                name = row["name"]
-                email = row["email"]
-                age = row["age"]
-
-                # check if email already exists
-                cursor.execute("SELECT * FROM user_data WHERE email = %s", (email,))
-                exists = cursor.fetchone()
-                if not exists:
-                    cursor.execute(
-                        "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
-                        (user_id, name, email, age)
-                    )
-        connection.commit()
-        print("Data inserted successfully")
+            while True:
+                chunk = [
+                    # generate uuid if not provided
+                    (str(uuid.uuid4()), row["name"], row["email"], row["age"])
+                    for row in itertools.islice(reader, chunk_size)
+                ]
+                if not chunk:
+                    break
+                # executemany rewrites this into one multi-row VALUES insert
+                cursor.executemany(
+                    "INSERT IGNORE INTO user_data (user_id, name, email, age) "
+                    "VALUES (%s, %s, %s, %s)",
+                    chunk
+                )
+                read += len(chunk)
+                inserted += cursor.rowcount
+                connection.commit()
+        elapsed = time.perf_counter() - start
+        print(f"Data inserted successfully: {inserted} of {read} rows "
+              f"in {elapsed:.2f}s ({read / elapsed if elapsed else 0:.0f} rows/sec)")
         cursor.close()
+        return inserted
     except Error as e:
         print(f"Error inserting data: {e}")
+        return None
+
+
+STAGING_TABLE = "user_data_staging"
+_merge_lock = threading.Lock()
+
+
+def split_csv(csv_file, chunk_rows, directory):
+    """Split a user CSV into header-less chunk files of name,email,age rows.
+
+    Returns the list of chunk file paths, in order.
+    """
+    paths = []
+    with open(csv_file, newline='', encoding="utf-8") as file:
+        reader = csv.DictReader(file)
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                break
+            path = os.path.join(directory, f"chunk_{len(paths):05d}.csv")
+            with open(path, "w", newline='', encoding="utf-8") as out:
+                writer = csv.writer(out, lineterminator="\n")
+                writer.writerows(
+                    (row["name"], row["email"], row["age"]) for row in rows
+                )
+            paths.append(path)
+    return paths
+
+
+def load_chunk(path):
+    """Load one chunk file into user_data on its own connection.
+
+    The chunk is staged in a TEMPORARY table, which only this connection
+    can see and which disappears with it, so concurrent loads never share
+    staging rows. The staged rows are then merged with INSERT IGNORE;
+    merges take _merge_lock so workers do not wait on each other's locks
+    on the email index.
+
+    Returns (rows staged, rows inserted into user_data).
+    """
+    connection = connect_to_prodev(allow_local_infile=True)
+    if connection is None:
+        raise Error(msg=f"Could not connect to ALX_prodev to load {path}")
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL,
+                age DECIMAL NOT NULL
+            );
+        """)
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE {STAGING_TABLE}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            (name, email, age)
+        """, (path,))
+        staged = cursor.rowcount
+        with _merge_lock:
+            cursor.execute(f"""
+                INSERT IGNORE INTO user_data (user_id, name, email, age)
+                SELECT UUID(), name, email, age FROM {STAGING_TABLE}
+            """)
+            inserted = cursor.rowcount
+            connection.commit()
+        cursor.close()
+        return staged, inserted
+    finally:
+        connection.close()
+
+
+def load_data_infile(connection, csv_file, workers=4, chunk_rows=250000):
+    """Bulk-load a CSV with LOAD DATA LOCAL INFILE and parallel workers.
+
+    The CSV is split into chunks which `workers` connections load in
+    parallel, each into its own unindexed TEMPORARY staging table. Each
+    chunk is then merged into user_data with an INSERT ... SELECT that
+    generates UUIDs server-side and drops duplicate emails through the
+    UNIQUE email index.
+
+    The server must have local_infile enabled. Returns the number of rows
+    inserted into user_data, or None on error (including when the email
+    index is missing and cannot be added).
+    """
+    if not ensure_email_index(connection):
+        print("Not loading data: duplicate emails would not be skipped")
+        return None
+    try:
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as directory:
+            chunks = split_csv(csv_file, chunk_rows, directory)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(load_chunk, chunks))
+        staged = sum(result[0] for result in results)
+        inserted = sum(result[1] for result in results)
+
+        elapsed = time.perf_counter() - start
+        print(f"Loaded {staged} rows from {len(chunks)} chunks, "
+              f"merged {inserted} new users in {elapsed:.2f}s "
+              f"({staged / elapsed if elapsed else 0:.0f} rows/sec)")
+        return inserted
+    except Error as e:
+        print(f"Error loading data: {e}")
+        return None
+
+
+def load_sqlite(csv_file, db_path="user_data.db", chunk_size=50000):
+    """Bulk-load a CSV into the local SQLite user_data table.
+
+    Mirrors load_data_infile: rows are staged in chunks into a TEMP table and
+    merged into user_data with one INSERT OR IGNORE ... SELECT that generates
+    the UUIDs, with duplicate emails dropped by a unique email index. The whole
+    load runs in a single transaction.
+
+    Returns the number of rows inserted into user_data.
+    """
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.create_function(
+            "uuid4", 0, lambda: str(uuid.uuid4()), deterministic=False
+        )
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS user_data (
+                user_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                age INTEGER NOT NULL
+            )
+        """)
+        ensure_sqlite_email_index(connection)
+        connection.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                name TEXT, email TEXT, age INTEGER
+            )
+        """)
+
+        start = time.perf_counter()
+        staged = 0
+        with connection:
+            with open(csv_file, newline='', encoding="utf-8") as file:
+                reader = csv.DictReader(file)
+                while True:
+                    chunk = [
+                        (row["name"], row["email"], row["age"])
+                        for row in itertools.islice(reader, chunk_size)
+                    ]
+                    if not chunk:
+                        break
+                    connection.executemany(
+                        f"INSERT INTO {STAGING_TABLE} VALUES (?, ?, ?)", chunk
+                    )
+                    staged += len(chunk)
+            inserted = connection.execute(f"""
+                INSERT OR IGNORE INTO user_data (user_id, name, email, age)
+                SELECT uuid4(), name, email, age FROM {STAGING_TABLE}
+            """).rowcount
+            connection.execute(f"DELETE FROM {STAGING_TABLE}")
+
+        elapsed = time.perf_counter() - start
+        print(f"Loaded {inserted} of {staged} rows into {db_path} "
+              f"in {elapsed:.2f}s ({staged / elapsed if elapsed else 0:.0f} rows/sec)")
+        return inserted
+    finally:
+        connection.close()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Unit tests for the 1-batch_processing module."""
+
+import importlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+batch_processing = importlib.import_module("1-batch_processing")
+
+# Stored as given: the age column below has no type, so SQLite keeps
+# strings as strings instead of converting them
+AGES = [30, 25, 26, 25.9, 26.5, -40, None, float("inf"), "30", "30.5",
+        " 40 ", "abc", "1e3", "nan", "inf", "", b"31",
+        "1" + "0" * 30]
+OLDER_THAN_25 = [30, 26, 26.5, "30", " 40 ", b"31", "1" + "0" * 30]
+
+
+@unittest.skipIf(batch_processing.np is None, "numpy is not installed")
+class TestColumnarMatchesRowPath(unittest.TestCase):
+    """Test class for batch_processing_columnar against batch_processing."""
+
+    def setUp(self):
+        """Create user_data.db with awkward ages in a scratch directory."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory)
+        conn = sqlite3.connect("user_data.db")
+        conn.execute("CREATE TABLE user_data (user_id TEXT PRIMARY KEY, "
+                     "name TEXT, email TEXT, age)")
+        conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?)",
+                         [(f"id{i}", f"User {i}", f"user{i}@example.com", age)
+                          for i, age in enumerate(AGES)])
+        conn.commit()
+        conn.close()
+
+    def test_row_path_follows_int(self):
+        """Test that batch_processing keeps the ages int() says are > 25."""
+        users = list(batch_processing.batch_processing(4))
+        self.assertEqual([user["age"] for user in users], OLDER_THAN_25)
+
+    def test_dicts_are_identical(self):
+        """Test that as_dicts yields exactly what batch_processing yields."""
+        for batch_size in (1, 4, 100):
+            with self.subTest(batch_size=batch_size):
+                self.assertEqual(
+                    list(batch_processing.batch_processing_columnar(
+                        batch_size, as_dicts=True)),
+                    list(batch_processing.batch_processing(batch_size)))
+
+    def test_column_batches_keep_the_same_users(self):
+        """Test that the column-batch mode keeps the same users."""
+        expected = [user["user_id"] for user in
+                    batch_processing.batch_processing(4)]
+        batches = batch_processing.batch_processing_columnar(4)
+        self.assertEqual([user_id for batch in batches
+                          for user_id in batch["user_id"]], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
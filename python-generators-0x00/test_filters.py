@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Unit tests for the filters module."""
+
+import sqlite3
+import unittest
+from filters import Predicate, build_select, col, compile_filter, where
+
+
+class TestPredicate(unittest.TestCase):
+    """Test class for the Predicate base class."""
+
+    def test_predicate_without_call_cannot_be_created(self):
+        """Test that subclasses must implement __call__."""
+        class Incomplete(Predicate):
+            pass
+
+        with self.assertRaises(TypeError):
+            Predicate()
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class TestNumericPushdown(unittest.TestCase):
+    """Test class for pushed-down comparisons with numbers."""
+
+    def setUp(self):
+        """Create a user_data table whose ages are stored as text."""
+        self.conn = sqlite3.connect(":memory:")
+        self.addCleanup(self.conn.close)
+        self.conn.execute("CREATE TABLE user_data (name TEXT, age TEXT)")
+        self.conn.executemany("INSERT INTO user_data VALUES (?, ?)",
+                              [("a", "100"), ("b", "30"), ("c", "3"),
+                               ("d", "25"), ("e", "25.5")])
+
+    def names(self, predicate):
+        """Return the names of the rows the pushed-down predicate keeps."""
+        sql, params, residual = build_select("user_data", ["name"], predicate)
+        self.assertIsNone(residual)
+        return sorted(name for (name,) in self.conn.execute(sql, params))
+
+    def test_text_ages_compare_as_numbers(self):
+        """Test that '100' > 25 holds and '3' > 25 does not."""
+        self.assertEqual(self.names(col("age") > 25), ["a", "b", "e"])
+        self.assertEqual(self.names(col("age") <= 25.5), ["c", "d", "e"])
+        self.assertEqual(self.names(col("age") == 100), ["a"])
+
+    def test_strings_are_compared_as_given(self):
+        """Test that only numeric values are cast."""
+        self.assertEqual(compile_filter(col("name") == "a")[:2],
+                         ("(name = ?)", ["a"]))
+        self.assertEqual(self.names(col("age") == "25.5"), ["e"])
+
+    def test_rowid_range_still_uses_the_primary_key(self):
+        """Test that the cast leaves rowid range lookups as searches."""
+        sql, params, _ = build_select(
+            "user_data", None, (col("rowid") >= 2) & (col("rowid") < 4))
+        [(*_, plan)] = self.conn.execute("EXPLAIN QUERY PLAN " + sql,
+                                         params).fetchall()
+        self.assertIn("SEARCH", plan)
+        self.assertEqual(len(self.conn.execute(sql, params).fetchall()), 2)
+
+    def test_mysql_placeholder_is_not_cast(self):
+        """Test that %s comparisons are left to MySQL's own coercion."""
+        sql, params, _ = compile_filter(col("age") > 25, placeholder="%s")
+        self.assertEqual((sql, params), ("(age > %s)", [25]))
+
+    def test_python_residual_is_kept(self):
+        """Test that untranslatable terms are returned for Python."""
+        is_b = where(lambda row: row["name"] == "b")
+        sql, params, residual = compile_filter((col("age") > 25) & is_b)
+        self.assertEqual(sql, "(age > CAST(? AS NUMERIC))")
+        self.assertIs(residual, is_b)
+
+
+if __name__ == "__main__":
+    unittest.main()